@@ -15,11 +15,24 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import numpy as np
+
 from .core.nmap_parser import NmapReportParser
 from .core.csv_parser import CSVFileParser
+from .core.masscan_parser import MasscanParser
+from .core.grepable_parser import NmapGrepableParser
 from .core.report import NmapReport, Host, Port
 from .core.output_manager import OutputManager, MatrixOutput, JsonOutput
 from .core.pandas_util import PandasBatea
+from .core.watcher import DirectoryWatcher
+from .core.baseline import Baseline
+from .core.dedup import DeduplicatedMatrix
+from .core.storage import BackingStore
+from .core.merge import HostMerger, merge_hosts
+from .core.shard import ShardResult
+from .core.history import ScoreHistory
+from .core.ensemble import ModelEnsemble
+from .core.aio import parse_async, matrix_async, score_async, model_process_pool
 from .features import FeatureBase
 
 
@@ -29,14 +42,26 @@ from .features.basic_features import MaxBannerLengthFeature, WindowsOSFeature, L
 from .features.basic_features import HttpServerCountFeature, DatabaseCountFeature, CommonWindowsDomainAdminFeature
 from .features.basic_features import CommonWindowsDomainMemberFeature, PortEntropyFeature, HostnameLengthFeature
 from .features.basic_features import HostnameEntropyFeature, TCPPortCountFeature
+from .features.basic_features import Ipv6GroupFeature, AddressFamilyFeature
+from .features.port_features import PortHashingFeature, PortSvdFeature
+from .features.script_features import SelfSignedCertificateFeature, ExpiredCertificateFeature, HttpTitleEntropyFeature
 
 
-def build_report():
-    report = NmapReport()
-    report.add_feature(IpOctetFeature(0))
-    report.add_feature(IpOctetFeature(1))
-    report.add_feature(IpOctetFeature(2))
-    report.add_feature(IpOctetFeature(3))
+def build_report(dtype=np.float64, store=None, address_family='ipv4', port_block=None, port_components=32,
+                 sketch_width=None, sketch_depth=4, script_features=False):
+    report = NmapReport(dtype=dtype, store=store)
+    if address_family in ['ipv4', 'dual']:
+        report.add_feature(IpOctetFeature(0))
+        report.add_feature(IpOctetFeature(1))
+        report.add_feature(IpOctetFeature(2))
+        report.add_feature(IpOctetFeature(3))
+    if address_family in ['ipv6', 'dual']:
+        report.add_feature(Ipv6GroupFeature(0))
+        report.add_feature(Ipv6GroupFeature(1))
+        report.add_feature(Ipv6GroupFeature(2))
+        report.add_feature(Ipv6GroupFeature(3))
+    if address_family == 'dual':
+        report.add_feature(AddressFamilyFeature())
     report.add_feature(TotalPortCountFeature())
     report.add_feature(OpenPortCountFeature())
     report.add_feature(LowPortCountFeature())
@@ -50,8 +75,16 @@ def build_report():
     report.add_feature(DatabaseCountFeature())
     report.add_feature(CommonWindowsDomainAdminFeature())
     report.add_feature(CommonWindowsDomainMemberFeature())
-    report.add_feature(PortEntropyFeature())
+    report.add_feature(PortEntropyFeature(sketch_width=sketch_width, sketch_depth=sketch_depth))
     report.add_feature(HostnameLengthFeature())
     report.add_feature(HostnameEntropyFeature())
+    if port_block == 'hash':
+        report.add_feature(PortHashingFeature(port_components))
+    elif port_block == 'svd':
+        report.add_feature(PortSvdFeature(port_components))
+    if script_features:
+        report.add_feature(SelfSignedCertificateFeature())
+        report.add_feature(ExpiredCertificateFeature())
+        report.add_feature(HttpTitleEntropyFeature())
 
     return report
@@ -17,92 +17,542 @@
 
 
 import click
+import time
+import numpy as np
 from .core import NmapReportParser, NmapReport, CSVFileParser, JsonOutput, BateaModel, MatrixOutput
-from defusedxml import ElementTree
-from xml.etree.ElementTree import ParseError
+from .core import MasscanParser, NmapGrepableParser
+from .core import DirectoryWatcher, Baseline, DeduplicatedMatrix, BackingStore, HostMerger
+from .core.ingest import ingest, report_totals, PARSE_ERRORS
+from .core.progress import Progress
+from .core.partition import partition_hosts, score_partitions, top_per_group
+from .core.shard import ShardResult
+from .core.budget import budget_model_params
+from .core.history import ScoreHistory
+from .core.ensemble import ModelEnsemble, AGGREGATES
+from .core.report import Host
 from batea import build_report
+from ipaddress import ip_address
 import warnings
 warnings.filterwarnings('ignore')
 
 
-@click.command(context_settings=dict(help_option_names=['-h', '--help']))
-@click.option("-c", "--read-csv", type=click.File('r'), multiple=True)
-@click.option("-x", "--read-xml", type=click.File('r'), multiple=True)
+def parse_max_samples(ctx, param, value):
+    """Subsample size of the trees: 'auto', a number of rows or a fraction of the rows."""
+    if value == 'auto':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        raise click.BadParameter("expected 'auto', a number of rows or a fraction of the rows")
+
+
+class DefaultGroup(click.Group):
+    """Group falling back to its default command when the first argument is not the name of a subcommand, so that
+    `batea nmap_report.xml` keeps ranking hosts along with `batea score-shard` and `batea merge`."""
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in ctx.help_option_names):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup, default_command='rank', context_settings=dict(help_option_names=['-h', '--help']))
+def main():
+    """Context-driven asset ranking based using anomaly detection"""
+
+
+@main.command('rank')
+@click.option("-c", "--read-csv", type=click.File('rb'), multiple=True)
+@click.option("-x", "--read-xml", type=click.File('rb'), multiple=True)
 @click.option("-n", "--n-output", type=int, default=5)
 @click.option("-A", "--output-all", is_flag=True)
-@click.option("-L", "--load-model", type=click.File('rb'), default=None)
+@click.option("--top-per", type=str, default=None)
+@click.option("-L", "--load-model", type=click.File('rb'), multiple=True)
+@click.option("--aggregate", type=click.Choice(AGGREGATES), default='mean-rank')
 @click.option("-D", "--dump-model", type=click.File('wb'), default=None)
-@click.option("-f", "--input-format", type=str, default='xml')
+@click.option("-f", "--input-format", type=click.Choice(['xml', 'csv', 'masscan', 'grepable']), default='xml')
 @click.option('-v', '--verbose', count=True)
-@click.option('-oM', "--output-matrix", type=click.File('w'), default=None)
-@click.argument("nmap_reports", type=click.File('r'), nargs=-1)
-def main(*, nmap_reports, input_format, dump_model, load_model,
-         output_all, read_csv, read_xml, n_output, verbose, output_matrix):
-    """Context-driven asset ranking based using anomaly detection"""
+@click.option('-oM', "--output-matrix", type=click.File('wb'), default=None)
+@click.option("--output-matrix-dtype", type=click.Choice(['uint16', 'uint8']), default=None)
+@click.option("--dtype", type=click.Choice(['float64', 'float32']), default='float64')
+@click.option("--backing-store", type=click.Path(file_okay=False), default=None)
+@click.option("--address-family", type=click.Choice(['ipv4', 'ipv6', 'dual']), default='ipv4')
+@click.option("--port-block", type=click.Choice(['hash', 'svd']), default=None)
+@click.option("--port-components", type=int, default=32)
+@click.option("--sketch-width", type=int, default=None)
+@click.option("--sketch-depth", type=int, default=4)
+@click.option("-m", "--merge-hosts", is_flag=True)
+@click.option("--merge-max-hosts", type=int, default=None)
+@click.option("-w", "--watch", type=click.Path(exists=True, file_okay=False), default=None)
+@click.option("--watch-interval", type=float, default=2.0)
+@click.option("-B", "--baseline", type=click.File('rb'), default=None)
+@click.option("--save-baseline", type=click.File('wb'), default=None)
+@click.option("--dedup", is_flag=True)
+@click.option("-j", "--ingest-workers", type=int, default=1)
+@click.option("--partition-by", type=str, default=None)
+@click.option("--partition-min-size", type=int, default=256)
+@click.option("--partition-workers", type=int, default=None)
+@click.option("--outlier-ratio", type=float, default=0.1)
+@click.option("--n-estimators", type=int, default=100)
+@click.option("--max-samples", type=str, default='auto', callback=parse_max_samples)
+@click.option("--n-jobs", type=int, default=None)
+@click.option("--random-state", type=int, default=None)
+@click.option("--time-budget", type=float, default=None)
+@click.option("--adaptive", is_flag=True)
+@click.option("--adaptive-batch-size", type=int, default=10)
+@click.option("--adaptive-tolerance", type=float, default=0.)
+@click.option("--max-estimators", type=int, default=1000)
+@click.option("--history", type=click.Path(dir_okay=False), default=None)
+@click.option("--prune-features", is_flag=True)
+@click.option("--calibrated", is_flag=True)
+@click.option("--script-features", is_flag=True)
+@click.option("--progress", "show_progress", is_flag=True)
+@click.option("--prune-near-constant", type=float, default=None)
+@click.argument("nmap_reports", type=click.File('rb'), nargs=-1)
+def rank(*, nmap_reports, input_format, dump_model, load_model,
+         output_all, read_csv, read_xml, n_output, verbose, output_matrix, watch, watch_interval,
+         baseline, save_baseline, dedup, dtype, output_matrix_dtype, backing_store, address_family, port_block,
+         port_components, sketch_width, sketch_depth, merge_hosts, merge_max_hosts, ingest_workers, partition_by,
+         partition_min_size, partition_workers, outlier_ratio, n_estimators, max_samples, n_jobs, random_state,
+         time_budget, adaptive, adaptive_batch_size, adaptive_tolerance, max_estimators, history, aggregate, top_per,
+         prune_features, prune_near_constant, calibrated, script_features, show_progress):
+    """Rank the hosts of the reports, the most anomalous first (default command)"""
 
-    report = build_report()
-    csv_parser = CSVFileParser()
-    xml_parser = NmapReportParser()
+    store = BackingStore(backing_store) if backing_store else None
+    report = build_report(dtype=dtype, store=store, address_family=address_family, port_block=port_block,
+                          port_components=port_components, sketch_width=sketch_width, sketch_depth=sketch_depth,
+                          script_features=script_features)
+    parsers = {
+        'xml': NmapReportParser(script_ids=report.get_script_ids()),
+        'csv': CSVFileParser(),
+        'masscan': MasscanParser(),
+        'grepable': NmapGrepableParser(),
+    }
     if output_matrix:
-        output_manager = MatrixOutput(output_matrix)
+        output_manager = MatrixOutput(output_matrix, quantize=output_matrix_dtype)
     else:
         output_manager = JsonOutput(verbose)
+    model_params = dict(outlier_ratio=outlier_ratio, n_estimators=n_estimators, max_samples=max_samples,
+                        n_jobs=n_jobs, random_state=random_state)
+    load_models = load_model
+    load_model = load_models[0] if load_models else None
 
-    try:
-        if input_format == 'xml':
-            for file in nmap_reports:
-                report.hosts.extend([host for host in xml_parser.load_hosts(file)])
-        if input_format == 'csv':
-            for file in nmap_reports:
-                report.hosts.extend([host for host in csv_parser.load_hosts(file)])
-        if read_csv:
-            for file in read_csv:
-                report.hosts.extend([host for host in csv_parser.load_hosts(file)])
-        if read_xml:
-            for file in read_xml:
-                report.hosts.extend([host for host in xml_parser.load_hosts(file)])
-    except (ParseError, UnicodeDecodeError, ElementTree.ParseError, ValueError) as e:
-        output_manager.log_parse_error(e)
+    if len(load_models) > 1 and (watch or baseline or dump_model or partition_by or time_budget or adaptive
+                                 or output_matrix or history or save_baseline):
+        output_manager.log_error("Several models (-L) can only be compared on the hosts of the reports, not in watch, "
+                                 "delta or partitioned mode, nor dumped or trained (-w, -B, --partition-by, -D, "
+                                 "--time-budget, --adaptive), and their scores can't be saved as those of one model "
+                                 "(-oM, --history, --save-baseline).")
         raise SystemExit
 
-    if len(report.hosts) == 0:
-        output_manager.log_empty_report()
+    if (prune_features or prune_near_constant is not None) and (load_models or partition_by or watch):
+        output_manager.log_error("Pruning selects the columns of a new model, it can't apply to pretrained models, "
+                                 "partitions or watch mode (-L, --partition-by, -w).")
         raise SystemExit
 
+    if calibrated and (len(load_models) > 1 or partition_by or watch):
+        output_manager.log_error("Calibrated percentiles come from a single model, they can't apply to several models, "
+                                 "partitions or watch mode (-L, --partition-by, -w).")
+        raise SystemExit
+
+    if watch:
+        watcher = DirectoryWatcher(watch, report, parsers[input_format], update_statistics=load_model is None)
+        watch_directory(watcher, load_model=load_model, n_output=n_output, output_all=output_all,
+                        verbose=verbose, interval=watch_interval, dedup=dedup, model_params=model_params)
+        return
+
+    sources = input_sources(parsers, input_format, nmap_reports, read_csv, read_xml)
+    # Masscan reports the ports of a host in random order, they have to be merged back into one host per address
+    merger = HostMerger(max_hosts=merge_max_hosts) if merge_hosts or input_format == 'masscan' else None
+    progress = Progress(enabled=show_progress)
+    read_hosts(report, output_manager, sources, merger, ingest_workers, progress=progress)
+
     report_features = report.get_feature_names()
     output_manager.add_report_info(report)
 
-    matrix_rep = report.generate_matrix_representation()
-
     batea = BateaModel(report_features=report_features)
 
-    if load_model is not None:
+    if baseline is not None and load_model is None:
+        output_manager.log_error("Delta mode needs the pretrained model of the baseline run (-L).")
+        raise SystemExit
+
+    if partition_by is not None and (load_model is not None or dump_model is not None or baseline is not None):
+        output_manager.log_error("Partitioned scoring trains one model per segment, it can't load, dump or "
+                                 "rescore a single model (-L, -D, -B).")
+        raise SystemExit
+
+    if time_budget is not None and load_model is not None:
+        output_manager.log_error("The time budget plans the training of a new model, it can't apply to a pretrained "
+                                 "model (-L).")
+        raise SystemExit
+
+    if adaptive and load_model is not None:
+        output_manager.log_error("Adaptive training grows the forest of a new model, it can't apply to a pretrained "
+                                 "model (-L).")
+        raise SystemExit
+
+    if len(load_models) > 1:
+        ensemble = ModelEnsemble.load(load_models, report_features)
+    elif load_model is not None:
         batea.load_model(load_model)
+        report.set_statistics(batea.statistics)
+        if calibrated and batea.quantiles is None:
+            output_manager.log_error("The model has no training score quantiles to calibrate with, it must be "
+                                     "retrained (-D).")
+            raise SystemExit
+    else:
+        report.fit_features()
+        batea.statistics = report.get_statistics()
+
+    segments = ensemble_scores = aggregated = order = None
+    if len(load_models) > 1:
+        with progress.stage('score', len(report.hosts)):
+            matrix_rep, ensemble_scores = ensemble.score(report)
+        # Hosts are ranked by the aggregate of the models, their score is the mean score of the models
+        aggregated, order = ensemble_scores.aggregate(aggregate)
+        scores = ensemble_scores.scores.mean(axis=0)
+        current = None
+
+    elif partition_by is not None:
+        matrix_rep = report.generate_matrix_representation()
+        partitions = partition_hosts(report.hosts, partition_by)
+        template = BateaModel()
+        template.build_model(**model_params)
+        output_manager.add_model_settings(model_params)
+        with progress.stage('fit and score', len(matrix_rep)):
+            scores = score_partitions(matrix_rep, partitions, min_size=partition_min_size,
+                                      workers=partition_workers, model=template.model)
+        segments = [None] * len(report.hosts)
+        for key, rows in partitions.items():
+            for i in rows:
+                segments[i] = str(key)
+        current = None
+
+    elif baseline is not None:
+        previous = Baseline.load(baseline)
+        if previous.model_digest != batea.digest():
+            output_manager.log_error("The baseline wasn't produced by the pretrained model (-L), it must be saved "
+                                     "again by a run of that model (--save-baseline).")
+            raise SystemExit
+        current, changes = previous.rescore(report, batea)
+        matrix_rep, scores = current.matrix, current.scores
+        output_manager.add_changed_hosts(changes)
 
     else:
-        batea.build_model()
-        batea.model.fit(matrix_rep)
+        with progress.stage('features', len(report.hosts)):
+            matrix_rep = report.generate_matrix_representation()
+        settings = dict(model_params)
+        if load_model is None and (prune_features or prune_near_constant is not None):
+            settings['pruned'] = batea.prune(matrix_rep, near_constant=prune_near_constant)
+        if load_model is None and time_budget is not None:
+            model_params, estimate = budget_model_params(matrix_rep, time_budget, model_params)
+            settings = {**settings, **model_params, 'time_budget': time_budget, 'estimated_time': estimate}
+        if adaptive:
+            # Within a time budget, the planned forest size bounds the growth of the forest
+            adaptive = dict(n_top=len(matrix_rep) if output_all else n_output, batch_size=adaptive_batch_size,
+                            tolerance=adaptive_tolerance,
+                            max_estimators=model_params['n_estimators'] if time_budget is not None else max_estimators)
+        with progress.stage('fit and score' if load_model is None else 'score', len(matrix_rep)):
+            scores = fit_and_score(batea, matrix_rep, fit=load_model is None, dedup=dedup, model_params=model_params,
+                                   out=store.allocate_scores(len(matrix_rep)) if store else None, adaptive=adaptive)
+        if load_model is None:
+            if adaptive:
+                settings.update(n_estimators=len(batea.model.estimators_), adaptive=adaptive)
+            output_manager.add_model_settings(settings)
+        current = None
+
+    report.matrix_representation = matrix_rep
+    groups = ranks = None
+    if order is None:
+        order = scores
+    if top_per is not None:
+        selection = top_per_group(report.hosts, order, top_per, len(scores) if output_all else n_output)
+        top_n = [j for _, rows in selection for j in rows]
+        groups = [key for key, rows in selection for _ in rows]
+        ranks = [i + 1 for _, rows in selection for i in range(len(rows))]
+    else:
+        top_n = top_hosts(order, n_output, output_all)
+    output_ranking(output_manager, report, matrix_rep, scores, top_n, segments,
+                   model=batea if partition_by is None else None, ensemble=ensemble_scores,
+                   aggregated=aggregated, groups=groups, ranks=ranks,
+                   percentiles=batea.percentile(scores[top_n]) if calibrated else None)
+
+    if dump_model:
+        batea.dump_model(dump_model)
+
+    if save_baseline:
+        model_digest = batea.digest() if partition_by is None and len(load_models) <= 1 else None
+        (current or Baseline.from_report(report, matrix_rep, scores, model_digest=model_digest)).save(save_baseline)
+
+    if history:
+        score_history = ScoreHistory(history)
+        score_history.record([str(host.address) for host in report.hosts], scores, matrix_rep,
+                             report.get_feature_names(), inputs=[file.name for _, file in sources])
+        score_history.close()
+
+
+@main.command('score-shard')
+@click.option("-c", "--read-csv", type=click.File('rb'), multiple=True)
+@click.option("-x", "--read-xml", type=click.File('rb'), multiple=True)
+@click.option("-L", "--load-model", type=click.File('rb'), required=True)
+@click.option("-o", "--output", type=click.File('wb'), required=True)
+@click.option("-k", "--top-k", type=int, default=100)
+@click.option("-f", "--input-format", type=click.Choice(['xml', 'csv', 'masscan', 'grepable']), default='xml')
+@click.option("--dtype", type=click.Choice(['float64', 'float32']), default='float64')
+@click.option("--address-family", type=click.Choice(['ipv4', 'ipv6', 'dual']), default='ipv4')
+@click.option("--port-block", type=click.Choice(['hash', 'svd']), default=None)
+@click.option("--port-components", type=int, default=32)
+@click.option("--script-features", is_flag=True)
+@click.option("-m", "--merge-hosts", is_flag=True)
+@click.option("--merge-max-hosts", type=int, default=None)
+@click.option("-j", "--ingest-workers", type=int, default=1)
+@click.argument("nmap_reports", type=click.File('rb'), nargs=-1)
+def score_shard(*, nmap_reports, input_format, load_model, output, top_k, read_csv, read_xml, dtype, address_family,
+                port_block, port_components, script_features, merge_hosts, merge_max_hosts, ingest_workers):
+    """Score a shard of the hosts with a pretrained model, writing a partial result for `batea merge`"""
+    report = build_report(dtype=dtype, address_family=address_family, port_block=port_block,
+                          port_components=port_components, script_features=script_features)
+    output_manager = JsonOutput()
+    parsers = {
+        'xml': NmapReportParser(script_ids=report.get_script_ids()),
+        'csv': CSVFileParser(),
+        'masscan': MasscanParser(),
+        'grepable': NmapGrepableParser(),
+    }
+    sources = input_sources(parsers, input_format, nmap_reports, read_csv, read_xml)
+    merger = HostMerger(max_hosts=merge_max_hosts) if merge_hosts or input_format == 'masscan' else None
+    read_hosts(report, output_manager, sources, merger, ingest_workers)
+
+    batea = BateaModel(report_features=report.get_feature_names())
+    batea.load_model(load_model)
+    report.set_statistics(batea.statistics)
+    matrix_rep = report.generate_matrix_representation()
+    ShardResult.from_report(report, matrix_rep, batea.score(matrix_rep), top_k=top_k).save(output)
+
+
+@main.command('merge')
+@click.option("-n", "--n-output", type=int, default=5)
+@click.option("-A", "--output-all", is_flag=True)
+@click.option('-v', '--verbose', count=True)
+@click.option("-o", "--output", type=click.File('wb'), default=None)
+@click.argument("shards", type=click.File('rb'), nargs=-1, required=True)
+def merge(*, shards, n_output, output_all, verbose, output):
+    """Merge the partial results of `batea score-shard` into the global ranking and score distribution"""
+    merged = ShardResult.merge(ShardResult.load(shard) for shard in shards)
+    output_manager = JsonOutput(verbose)
+    output_manager.add_shards_info(merged, len(shards))
+    output_manager.add_score_distribution(merged.distribution())
+
+    if output_all or n_output > merged.top_k:
+        # Beyond the top-K kept by the shards, hosts are ranked from their scores alone and come without features
+        top_n = top_hosts(merged.scores, n_output, output_all)
+        addresses, scores = [merged.addresses[j] for j in top_n], merged.scores[top_n]
+    else:
+        addresses, scores = merged.top_addresses[:n_output], merged.top_scores[:n_output]
+
+    top = {address: i for i, address in reversed(list(enumerate(merged.top_addresses)))}
+    for rank, (address, score) in enumerate(zip(addresses, scores)):
+        i = top.get(address)
+        address = ip_address(address)
+        host = Host(ipv4=address) if address.version == 4 else Host(ipv6=address)
+        features = None
+        if i is not None:
+            host.hostname = merged.top_hostnames[i] or None
+            features = {name: value for name, value in zip(merged.features, merged.top_matrix[i, :])}
+        output_manager.add_host_info(rank=str(rank + 1), score=score, host=host, features=features)
+    output_manager.flush()
+
+    if output:
+        merged.save(output)
+
+
+@main.group('history')
+def history():
+    """Query the score history recorded by `batea --history`"""
+
+
+@history.command('movers')
+@click.option("-n", "--n-output", type=int, default=10)
+@click.option("--run", type=int, default=None)
+@click.argument("history_file", type=click.Path(exists=True, dir_okay=False))
+def history_movers(*, history_file, n_output, run):
+    """Hosts that climbed the most ranks since the previous run"""
+    store = ScoreHistory(history_file)
+    output_manager = JsonOutput()
+    output_manager.add_top_movers(store.top_movers(n_output, run_id=run))
+    output_manager.flush()
+    store.close()
 
-    scores = -batea.model.score_samples(matrix_rep)
-    output_manager.add_scores(scores)
 
+@history.command('host')
+@click.argument("history_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("address")
+def history_host(*, history_file, address):
+    """Score, rank and features of a host across runs"""
+    store = ScoreHistory(history_file)
+    output_manager = JsonOutput()
+    output_manager.add_host_history(address, store.host_history(address))
+    output_manager.flush()
+    store.close()
+
+
+def input_sources(parsers, input_format, nmap_reports, read_csv, read_xml):
+    sources = [(parsers[input_format], file) for file in nmap_reports]
+    sources.extend((parsers['csv'], file) for file in read_csv)
+    sources.extend((parsers['xml'], file) for file in read_xml)
+    return sources
+
+
+def read_hosts(report, output_manager, sources, merger, workers, progress=None):
+    """Parse the sources into the hosts of the report, quitting on unreadable or empty inputs. With progress
+    enabled, the headers of nmap XML reports give the number of hosts to expect."""
+    progress = progress or Progress()
+    try:
+        hosts = progress.track(ingest(sources, workers=workers), 'parse', expected_hosts(sources, progress))
+        if merger is not None:
+            merger.add(hosts)
+            report.hosts = list(merger.hosts())
+        else:
+            report.hosts.extend(hosts)
+    except PARSE_ERRORS as e:
+        output_manager.log_parse_error(e)
+        raise SystemExit
+
+    if len(report.hosts) == 0:
+        output_manager.log_empty_report()
+        raise SystemExit
+
+
+def expected_hosts(sources, progress):
+    """Total number of hosts announced by the runstats of the sources, None unless they are all nmap XML reports
+    announcing it (it is only read to report progress)."""
+    if not progress.enabled or not all(isinstance(parser, NmapReportParser) for parser, _ in sources):
+        return None
+    totals = [report_totals(file) for _, file in sources]
+    if any(total['hosts'] is None for total in totals):
+        return None
+    services = {total['services'] for total in totals if total['services'] is not None}
+    progress.message(f"reports: {len(sources)} files, {sum(total['hosts'] for total in totals)} hosts up out of "
+                     f"{sum(total['scanned'] for total in totals)} scanned"
+                     + (f", {max(services)} services per host" if services else ""))
+    return sum(total['hosts'] for total in totals)
+
+
+def fit_and_score(batea, matrix_rep, fit, dedup=False, out=None, model_params=None, adaptive=None):
+    """Fit the model unless it was pretrained, then score every row. With `dedup`, identical rows are fitted with
+    their counts as weights and scored only once. With `adaptive` (the arguments of `BateaModel.fit_adaptive`), the
+    forest is grown until its ranking converges, which scores the rows along the way. A fitted model keeps the
+    quantiles of the scores of its training rows to calibrate later scores."""
+    scores = _fit_and_score(batea, matrix_rep, fit, dedup=dedup, out=out, model_params=model_params, adaptive=adaptive)
+    if fit:
+        batea.calibrate(scores)
+    return scores
+
+
+def _fit_and_score(batea, matrix_rep, fit, dedup, out, model_params, adaptive):
+    if dedup:
+        unique_rep = DeduplicatedMatrix(matrix_rep)
+        if fit and adaptive:
+            batea.build_model(**(model_params or {}))
+            scores = unique_rep.broadcast(batea.fit_adaptive(unique_rep.unique, sample_weight=unique_rep.counts,
+                                                             **adaptive))
+        else:
+            if fit:
+                batea.build_model(**(model_params or {}))
+                batea.fit(unique_rep.unique, sample_weight=unique_rep.counts)
+            scores = unique_rep.broadcast(batea.score(unique_rep.unique))
+        if out is not None:
+            out[:] = scores
+            scores = out
+        return scores
+
+    if fit and adaptive:
+        batea.build_model(**(model_params or {}))
+        scores = batea.fit_adaptive(matrix_rep, **adaptive)
+        if out is not None:
+            out[:] = scores
+            scores = out
+        return scores
+
+    if fit:
+        batea.build_model(**(model_params or {}))
+        batea.fit(matrix_rep)
+    return batea.score(matrix_rep, out=out)
+
+
+def top_hosts(scores, n_output, output_all):
     if output_all:
         n_output = len(scores)
     n_output = min(n_output, len(scores))
 
-    top_n = scores.argsort()[-n_output:][::-1]
+    return scores.argsort()[-n_output:][::-1]
+
+
+def output_ranking(output_manager, report, matrix_rep, scores, top_n, segments=None, model=None, ensemble=None,
+                   aggregated=None, groups=None, ranks=None, percentiles=None):
+    """Emit the hosts of `top_n`, ranked in order unless `ranks` (e.g. ranks within the `groups` of the hosts) are
+    given."""
+    report_features = report.get_feature_names()
+    output_manager.add_scores(scores)
+
+    contributions = None
+    if model is not None and model.model is not None and output_manager.verbosity > 0 and len(top_n) > 0:
+        contributions = model.explain(matrix_rep[top_n])
 
     for i, j in enumerate(top_n):
         output_manager.add_host_info(
-            rank=str(i+1),
+            rank=str(ranks[i] if ranks is not None else i+1),
             score=scores[j],
             host=report.hosts[j],
-            features={name: value for name, value in zip(report_features, matrix_rep[j, :])}
+            features={name: value for name, value in zip(report_features, matrix_rep[j, :].tolist())},
+            segment=segments[j] if segments is not None else None,
+            group=groups[i] if groups is not None else None,
+            percentile=float(percentiles[i]) if percentiles is not None else None,
+            contributions=explain(report_features, contributions[i]) if contributions is not None else None,
+            models=ensemble.host_info(j) if ensemble is not None else None,
+            aggregate=float(aggregated[j]) if aggregated is not None else None
         )
     output_manager.flush()
 
-    if dump_model:
-        batea.dump_model(dump_model)
+
+def explain(report_features, contributions):
+    """Contribution of every feature to the isolation of a host, the most contributing first."""
+    order = np.argsort(contributions, kind='stable')[::-1]
+    return {report_features[k]: float(contributions[k]) for k in order}
+
+
+def watch_directory(watcher, *, load_model, n_output, output_all, verbose, interval, dedup, model_params=None):
+    """Poll the spool directory forever, rescoring and emitting the top hosts every time their ranking changes."""
+    batea = BateaModel(report_features=watcher.report.get_feature_names())
+    if load_model is not None:
+        batea.load_model(load_model)
+        watcher.report.set_statistics(batea.statistics)
+
+    previous = None
+    try:
+        while True:
+            if watcher.poll() and len(watcher.report.hosts) > 0:
+                matrix_rep = watcher.matrix_representation
+                scores = fit_and_score(batea, matrix_rep, fit=load_model is None, dedup=dedup,
+                                       model_params=model_params)
+                top_n = top_hosts(scores, n_output, output_all)
+                ranking = [watcher.report.hosts[j].address for j in top_n]
+                if ranking != previous:
+                    previous = ranking
+                    output_manager = JsonOutput(verbose)
+                    output_manager.add_report_info(watcher.report)
+                    output_ranking(output_manager, watcher.report, matrix_rep, scores, top_n, model=batea)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
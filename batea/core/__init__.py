@@ -17,6 +17,16 @@
 
 from .nmap_parser import NmapReportParser
 from .csv_parser import CSVFileParser
+from .masscan_parser import MasscanParser
+from .grepable_parser import NmapGrepableParser
 from .report import NmapReport, Host, Port
 from .output_manager import JsonOutput, MatrixOutput
 from .model import BateaModel
+from .watcher import DirectoryWatcher
+from .baseline import Baseline
+from .dedup import DeduplicatedMatrix
+from .storage import BackingStore
+from .merge import HostMerger, merge_hosts
+from .shard import ShardResult
+from .history import ScoreHistory
+from .ensemble import ModelEnsemble
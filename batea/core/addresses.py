@@ -0,0 +1,75 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from functools import cached_property
+import numpy as np
+
+
+IPV4 = 1
+IPV6 = 2
+
+LOW_64_BITS = (1 << 64) - 1
+
+
+class AddressArray:
+    """Host addresses packed into integer arrays: uint32 for IPv4 and two uint64 (high and low halves) for IPv6,
+    along with a bit mask of the address families each host was scanned with. Missing addresses are packed as 0.
+
+    `ipaddress` objects already hold their packed integer, so packing only costs one attribute read per host and
+    octet or prefix features can then be computed with shifts and masks over the whole array. Each array is packed
+    on first use, so that IPv4 features don't pay for IPv6 addresses.
+    """
+
+    def __init__(self, hosts):
+        self.hosts = hosts
+
+    @classmethod
+    def from_hosts(cls, hosts):
+        return cls(hosts)
+
+    @cached_property
+    def ipv4(self):
+        return np.fromiter((int(host.ipv4) if host.ipv4 is not None else 0 for host in self.hosts),
+                           dtype=np.uint32, count=len(self.hosts))
+
+    @cached_property
+    def _ipv6(self):
+        ipv6 = [int(host.ipv6) if host.ipv6 is not None else 0 for host in self.hosts]
+        return (np.fromiter((address >> 64 for address in ipv6), dtype=np.uint64, count=len(ipv6)),
+                np.fromiter((address & LOW_64_BITS for address in ipv6), dtype=np.uint64, count=len(ipv6)))
+
+    @property
+    def ipv6_high(self):
+        return self._ipv6[0]
+
+    @property
+    def ipv6_low(self):
+        return self._ipv6[1]
+
+    @cached_property
+    def family(self):
+        return np.fromiter(((IPV4 if host.ipv4 is not None else 0) | (IPV6 if host.ipv6 is not None else 0)
+                            for host in self.hosts), dtype=np.uint8, count=len(self.hosts))
+
+    def ipv4_octet(self, octet):
+        """Octet of the IPv4 addresses, 0 being the most significant."""
+        return (self.ipv4 >> np.uint32(8 * (3 - octet))) & np.uint32(0xFF)
+
+    def ipv6_group(self, group):
+        """16 bits group of the IPv6 addresses, 0 being the most significant."""
+        half = self.ipv6_high if group < 4 else self.ipv6_low
+        return (half >> np.uint64(16 * (3 - group % 4))) & np.uint64(0xFFFF)
@@ -0,0 +1,143 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from .ingest import open_input
+from .nmap_parser import NmapReportParser
+from .model import SCORE_BLOCK_SIZE
+from .storage import iter_blocks
+
+
+PARSE_BATCH_SIZE = 1024
+
+# Model of the worker processes created by `model_process_pool`
+_model = None
+
+
+def _open(file):
+    if isinstance(file, str):
+        return open_input(open(file, 'rb'))
+    return open_input(file)
+
+
+def _take(hosts, n):
+    return list(islice(hosts, n))
+
+
+def _parse_path(parser, path):
+    with _open(path) as file:
+        return list(parser.load_hosts(file))
+
+
+async def parse_async(file, parser=None, executor=None, batch_size=PARSE_BATCH_SIZE):
+    """Parse a report without blocking the event loop.
+
+    With a thread executor (the default one of the loop, or any other), the file is opened and read by the workers,
+    `batch_size` hosts at a time, so that a cancelled task stops reading at the next batch. With a process executor,
+    the whole file is parsed by one worker process from its path, and cancelling only discards the result.
+
+      Parameters
+      ----------
+      file : str or binary file object
+          Path or binary file object of a plain or compressed report (only paths with a process executor)
+      parser : parser, optional
+          Parser of the report format, defaults to NmapReportParser
+      executor : concurrent.futures.Executor, optional
+          Executor running the reads and parsing, defaults to the executor of the loop
+
+      Returns
+      -------
+      hosts : list
+          Parsed hosts
+    """
+    loop = asyncio.get_running_loop()
+    parser = parser or NmapReportParser()
+    if isinstance(executor, ProcessPoolExecutor):
+        return await loop.run_in_executor(executor, _parse_path, parser, file)
+
+    stream = await loop.run_in_executor(executor, _open, file)
+    hosts = []
+    try:
+        iterator = iter(await loop.run_in_executor(executor, parser.load_hosts, stream))
+        while True:
+            batch = await loop.run_in_executor(executor, _take, iterator, batch_size)
+            hosts.extend(batch)
+            if len(batch) < batch_size:
+                return hosts
+    finally:
+        if isinstance(file, str):
+            stream.close()
+        else:
+            # Leave the file of the caller open
+            stream.detach()
+
+
+async def matrix_async(report, hosts=None, executor=None):
+    """Build the feature matrix of `hosts` (defaults to every host of the report) in a thread of `executor`."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, report.generate_matrix_representation, hosts)
+
+
+def _install_model(batea):
+    global _model
+    _model = batea
+
+
+def _score_installed(matrix):
+    return _model.score(matrix)
+
+
+def model_process_pool(batea, max_workers=None):
+    """Process pool whose workers receive a copy of `batea` once, at startup, for `score_async` to score with."""
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_install_model, initargs=(batea,))
+
+
+async def score_async(batea, matrix, executor=None, block_size=SCORE_BLOCK_SIZE):
+    """Anomaly score of every row, computed by blocks without blocking the event loop.
+
+    Blocks are awaited one after the other, so concurrent requests interleave on the executor and a cancelled request
+    stops at the next block. Thread executors share `batea` between all requests without copying it, the forest being
+    read-only once fitted. Process executors must be created by `model_process_pool`, whose workers hold their own
+    copy of the model so that only the blocks of rows are sent to them.
+
+      Parameters
+      ----------
+      batea : BateaModel
+          Fitted model
+      matrix : numpy ndarray
+          Feature matrix, one row per host
+      executor : concurrent.futures.Executor, optional
+          Executor scoring the blocks, defaults to the executor of the loop
+      block_size : int
+          Number of rows scored at once
+
+      Returns
+      -------
+      scores : numpy ndarray
+          Anomaly score of every row, the higher the more anomalous
+    """
+    loop = asyncio.get_running_loop()
+    scores = np.empty(len(matrix))
+    for block in iter_blocks(len(matrix), block_size):
+        if isinstance(executor, ProcessPoolExecutor):
+            scores[block] = await loop.run_in_executor(executor, _score_installed, np.asarray(matrix[block]))
+        else:
+            scores[block] = await loop.run_in_executor(executor, batea.score, matrix[block])
+    return scores
@@ -0,0 +1,141 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy as np
+
+
+def rank_scores(scores):
+    """1-based rank of every host, the most anomalous host being ranked first (ties are ordered as in the output)."""
+    ranks = np.empty(len(scores), dtype=np.int64)
+    ranks[scores.argsort()[::-1]] = np.arange(1, len(scores) + 1)
+    return ranks
+
+
+class Baseline:
+    """Per-host fingerprints, feature vectors and scores of a previous run, indexed by address.
+
+    Rescoring a report against a baseline only computes the features and scores of new or changed hosts; the rows of
+    unchanged hosts are copied over. This is only valid when both runs share the same pretrained model, whose frozen
+    feature statistics make the rows of unchanged hosts independent from the rest of the network. The digest of that
+    model (see `BateaModel.digest`) is kept to check it, None if unknown.
+    """
+
+    def __init__(self, addresses, fingerprints, matrix, scores, features, model_digest=None):
+        self.addresses = list(addresses)
+        self.fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        self.matrix = matrix
+        self.scores = scores
+        self.features = list(features)
+        self.model_digest = model_digest
+
+    @classmethod
+    def from_report(cls, report, matrix, scores, fingerprints=None, model_digest=None):
+        if fingerprints is None:
+            fingerprints = [host.fingerprint() for host in report.hosts]
+        return cls(addresses=[str(host.address) for host in report.hosts],
+                   fingerprints=fingerprints,
+                   matrix=matrix,
+                   scores=scores,
+                   features=report.get_feature_names(),
+                   model_digest=model_digest)
+
+    @classmethod
+    def load(cls, file):
+        data = np.load(file, allow_pickle=False)
+        # Baselines saved before the model digest was stored, or without a single model, have none
+        model_digest = str(data['model_digest']) if 'model_digest' in data.files else ''
+        return cls(addresses=data['addresses'],
+                   fingerprints=data['fingerprints'],
+                   matrix=data['matrix'],
+                   scores=data['scores'],
+                   features=data['features'],
+                   model_digest=model_digest or None)
+
+    def save(self, file):
+        np.savez_compressed(file,
+                            addresses=np.array(self.addresses, dtype=str),
+                            fingerprints=self.fingerprints,
+                            matrix=self.matrix,
+                            scores=self.scores,
+                            features=np.array(self.features, dtype=str),
+                            model_digest=np.array(self.model_digest or ''))
+
+    def rescore(self, report, batea):
+        """Score `report` reusing the rows and scores of the hosts that did not change since the baseline.
+
+          Parameters
+          ----------
+          report : NmapReport
+              The new report, whose features hold the statistics of the pretrained model
+          batea : BateaModel
+              The pretrained model used to produce the baseline
+
+          Returns
+          -------
+          current : Baseline
+              The baseline of the new run, holding its full matrix and scores
+          changes : list
+              New, changed and removed hosts along with their previous and current rank
+        """
+        assert self.features == report.get_feature_names(), \
+            f"Baseline and report don't share matching features: {self.features} != {report.get_feature_names()}"
+        assert self.model_digest is not None and self.model_digest == batea.digest(), \
+            "Baseline wasn't produced by the pretrained model, it can't be rescored with it"
+
+        index = {address: i for i, address in enumerate(self.addresses)}
+        current = Baseline.from_report(report, None, None, model_digest=self.model_digest)
+        source = np.array([index.get(address, -1) for address in current.addresses], dtype=np.int64)
+
+        unchanged = source >= 0
+        unchanged[unchanged] = self.fingerprints[source[unchanged]] == current.fingerprints[unchanged]
+        changed = np.flatnonzero(~unchanged)
+
+        current.matrix = np.empty(shape=(len(report.hosts), len(current.features)), dtype=report.dtype)
+        current.scores = np.empty(len(report.hosts))
+        current.matrix[unchanged] = self.matrix[source[unchanged]]
+        current.scores[unchanged] = self.scores[source[unchanged]]
+        if len(changed) > 0:
+            current.matrix[changed] = report.generate_matrix_representation([report.hosts[i] for i in changed])
+            current.scores[changed] = batea.score(current.matrix[changed])
+
+        return current, self._changes(current, source, changed)
+
+    def _changes(self, current, source, changed):
+        previous_ranks = rank_scores(self.scores)
+        ranks = rank_scores(current.scores)
+
+        changes = []
+        for i in changed:
+            changes.append({
+                'host': current.addresses[i],
+                'status': 'changed' if source[i] >= 0 else 'new',
+                'previous_rank': int(previous_ranks[source[i]]) if source[i] >= 0 else None,
+                'rank': int(ranks[i]),
+                'score': float(current.scores[i]),
+            })
+
+        kept = np.zeros(len(self.addresses), dtype=bool)
+        kept[source[source >= 0]] = True
+        for i in np.flatnonzero(~kept):
+            changes.append({
+                'host': self.addresses[i],
+                'status': 'removed',
+                'previous_rank': int(previous_ranks[i]),
+                'rank': None,
+                'score': None,
+            })
+        return changes
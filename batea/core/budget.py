@@ -0,0 +1,141 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import time
+import numpy as np
+from .model import BateaModel
+
+
+BENCHMARK_ESTIMATORS = 8
+BENCHMARK_ROWS = 4096
+BENCHMARK_MAX_SAMPLES = 256
+MIN_ESTIMATORS = 10
+CANDIDATE_MAX_SAMPLES = (256, 128, 64)
+# Share of the remaining budget given to fitting and scoring, the rest is headroom for the output
+BUDGET_SHARE = 0.8
+
+
+def benchmark(batea, matrix, rows=BENCHMARK_ROWS, random_state=None):
+    """Time fitting and scoring a model with a few trees on a sample of the matrix.
+
+      Parameters
+      ----------
+      batea : BateaModel
+          Model holding a small, unfitted forest (its max_samples should be `BENCHMARK_MAX_SAMPLES` or 'auto')
+      matrix : numpy ndarray
+          Feature matrix, one row per host
+      rows : int
+          Number of rows of the sample
+
+      Returns
+      -------
+      fit_cost : float
+          Seconds spent fitting one tree
+      score_cost : float
+          Seconds spent scoring one row with one tree
+    """
+    random_state = np.random.RandomState(random_state)
+    sample = matrix[np.sort(random_state.choice(len(matrix), min(len(matrix), rows), replace=False))]
+    n_estimators = batea.model.n_estimators
+
+    start = time.perf_counter()
+    batea.fit(sample)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batea.score(sample)
+    score_time = time.perf_counter() - start
+
+    return fit_time / n_estimators, score_time / (n_estimators * len(sample))
+
+
+def _subsample_size(max_samples, n_samples):
+    if isinstance(max_samples, float):
+        return max(1, int(max_samples * n_samples))
+    return min(max_samples, n_samples)
+
+
+def plan_model(n_samples, budget, fit_cost, score_cost, n_estimators=100, max_samples='auto', n_jobs=None):
+    """Pick the forest size, subsample size and parallelism fitting and scoring `n_samples` rows within `budget`.
+
+    Trees are fitted in parallel and cost about linearly in their subsample size, while scoring a row with a tree
+    costs about the depth of the tree, i.e. the log of its subsample size. The largest number of trees (at most
+    `n_estimators`, at least `MIN_ESTIMATORS`) fitting within the budget is kept, trying smaller subsamples when even
+    `MIN_ESTIMATORS` trees would not fit.
+
+      Parameters
+      ----------
+      n_samples : int
+          Number of rows to fit and score
+      budget : float
+          Seconds available for fitting and scoring
+      fit_cost, score_cost : float
+          Costs measured by `benchmark`
+      n_estimators : int
+          Upper bound on the number of trees
+      max_samples : str, int or float
+          Subsample size of the trees, 'auto' letting the budget pick it
+      n_jobs : int, optional
+          Number of parallel jobs, defaults to the number of CPUs
+
+      Returns
+      -------
+      settings : dict
+          Arguments of `BateaModel.build_model`
+      estimate : float
+          Expected seconds spent fitting and scoring
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    reference = min(BENCHMARK_MAX_SAMPLES, n_samples)
+    candidates = CANDIDATE_MAX_SAMPLES if max_samples == 'auto' else (max_samples,)
+
+    for candidate in candidates:
+        size = _subsample_size(candidate, n_samples)
+        tree_cost = (fit_cost * size / reference / n_jobs
+                     + score_cost * n_samples * np.log2(max(size, 2)) / np.log2(max(reference, 2)))
+        trees = int(budget * BUDGET_SHARE / tree_cost) if tree_cost > 0 else n_estimators
+        if trees >= MIN_ESTIMATORS:
+            break
+
+    trees = max(MIN_ESTIMATORS, min(n_estimators, trees))
+    settings = {'n_estimators': trees, 'max_samples': candidate, 'n_jobs': n_jobs}
+    return settings, trees * tree_cost
+
+
+def budget_model_params(matrix, budget, model_params):
+    """Benchmark the forest on the matrix then plan `model_params` (the arguments of `BateaModel.build_model`) so that
+    the whole fit and score, benchmark included, takes about `budget` seconds.
+
+      Returns
+      -------
+      model_params : dict
+          Planned arguments of `BateaModel.build_model`
+      estimate : float
+          Expected seconds spent fitting and scoring, benchmark included
+    """
+    start = time.perf_counter()
+    probe = BateaModel()
+    probe.build_model(**{**model_params, 'n_estimators': BENCHMARK_ESTIMATORS, 'max_samples': 'auto'})
+    fit_cost, score_cost = benchmark(probe, matrix, random_state=model_params.get('random_state'))
+    elapsed = time.perf_counter() - start
+
+    settings, estimate = plan_model(len(matrix), max(budget - elapsed, 0.), fit_cost, score_cost,
+                                    n_estimators=model_params.get('n_estimators', 100),
+                                    max_samples=model_params.get('max_samples', 'auto'),
+                                    n_jobs=model_params.get('n_jobs'))
+    return {**model_params, **settings}, elapsed + estimate
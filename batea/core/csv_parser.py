@@ -22,6 +22,7 @@ from .report import Host, Port
 
 ALLOWED_COLUMNS = [
     'ipv4',
+    'ipv6',
     'hostname',
     'os_name',
     'port',
@@ -41,13 +42,16 @@ class CSVFileParser:
 
         reader = csv.DictReader(file)
 
-        current_host = None
+        current_address = None
         hosts = []
         for row in reader:
-            if len(hosts) == 0 or hosts[-1].ipv4.exploded != row['ipv4']:
-                hosts.append(Host(ipv4=ip_address(row.get('ipv4', None)),
-                                  hostname=row.get('hostname', None),
-                                  os_info={'name': row.get('os_name', None)}))
+            address = row.get('ipv4') or row.get('ipv6')
+            if len(hosts) == 0 or current_address != address:
+                current_address = address
+                hosts.append(Host(hostname=row.get('hostname', None),
+                                  os_info={'name': row.get('os_name', None)},
+                                  metadata={key: value for key, value in row.items() if key not in ALLOWED_COLUMNS},
+                                  **self._parse_addresses(row)))
 
             if row.get('port', None) not in ['', None]:
                 hosts[-1].ports.append(Port(
@@ -60,3 +64,12 @@ class CSVFileParser:
                     cpe=row.get('cpe', None)
                 ))
         return hosts
+
+    def _parse_addresses(self, row):
+        """IPv6 addresses are accepted in the `ipv4` column as well, for single-column dual-stack exports."""
+        addresses = {}
+        for column in ['ipv4', 'ipv6']:
+            if row.get(column):
+                address = ip_address(row[column])
+                addresses[f'ipv{address.version}'] = address
+        return addresses
@@ -0,0 +1,37 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy as np
+
+
+class DeduplicatedMatrix:
+    """Identical rows of a feature matrix collapsed into unique rows and their counts.
+
+    Networks often hold thousands of identical hosts, so fitting and scoring the unique rows and broadcasting the
+    scores back to hosts is much cheaper than working on the full matrix.
+    """
+
+    def __init__(self, matrix):
+        self.unique, inverse, self.counts = np.unique(matrix, axis=0, return_inverse=True, return_counts=True)
+        self.inverse = inverse.reshape(-1)
+
+    def __len__(self):
+        return len(self.unique)
+
+    def broadcast(self, values):
+        """Map per unique row values (e.g. scores) back to every row of the original matrix."""
+        return values[self.inverse]
@@ -0,0 +1,107 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .baseline import rank_scores
+from .model import BateaModel
+
+
+AGGREGATES = ['mean-rank', 'min-rank', 'max-rank', 'mean-score']
+
+
+class EnsembleScores:
+    """Scores and ranks of the hosts of a report under several models, and their aggregate."""
+
+    def __init__(self, names, scores):
+        self.names = list(names)
+        self.scores = np.asarray(scores)
+        self.ranks = np.array([rank_scores(scores) for scores in self.scores]).reshape(self.scores.shape)
+
+    def aggregate(self, method='mean-rank'):
+        """Aggregate of the models for every host, along with a key ordering hosts like scores (the higher the more
+        anomalous)."""
+        if method == 'mean-score':
+            values = self.scores.mean(axis=0)
+            return values, values
+        if method == 'mean-rank':
+            values = self.ranks.mean(axis=0)
+        elif method == 'min-rank':
+            values = self.ranks.min(axis=0)
+        elif method == 'max-rank':
+            values = self.ranks.max(axis=0)
+        else:
+            raise ValueError(f"Unknown aggregate {method}, expected one of {AGGREGATES}")
+        return values, -values
+
+    def host_info(self, i):
+        return [{'model': name, 'score': float(scores[i]), 'rank': int(ranks[i])}
+                for name, scores, ranks in zip(self.names, self.scores, self.ranks)]
+
+
+class ModelEnsemble:
+    """Several pretrained models scoring the hosts of one report.
+
+    Columns of features without statistics are computed once. Models are only given their own copy of the matrix
+    when their feature statistics differ from those of the first model, in which case only the columns of the
+    features whose statistics differ are recomputed. Models then score their matrix in parallel threads.
+    """
+
+    def __init__(self, models, names):
+        self.models = list(models)
+        self.names = list(names)
+
+    @classmethod
+    def load(cls, model_files, report_features):
+        models = []
+        for model_file in model_files:
+            model = BateaModel(report_features=report_features)
+            model.load_model(model_file)
+            models.append(model)
+        return cls(models, [getattr(model_file, 'name', str(i)) for i, model_file in enumerate(model_files)])
+
+    def matrices(self, report):
+        report.set_statistics(self.models[0].statistics)
+        matrix = report.generate_matrix_representation()
+        matrices = [matrix]
+        first = self.models[0].statistics
+        for model in self.models[1:]:
+            # Not only context dependent features keep statistics, e.g. the projection of PortSvdFeature
+            changed = {name for name in set(first) | set(model.statistics)
+                       if first.get(name) != model.statistics.get(name)}
+            if not changed:
+                matrices.append(matrix)
+            else:
+                report.set_statistics(model.statistics)
+                matrices.append(report.update_feature_columns(matrix.copy(), changed))
+        report.set_statistics(self.models[0].statistics)
+        return matrices
+
+    def score(self, report, workers=None):
+        """Score the hosts of `report` with every model.
+
+          Returns
+          -------
+          matrix : numpy ndarray
+              Feature matrix computed with the statistics of the first model
+          scores : EnsembleScores
+              Scores and ranks of every host under every model
+        """
+        matrices = self.matrices(report)
+        with ThreadPoolExecutor(max_workers=workers or len(self.models)) as executor:
+            scores = list(executor.map(lambda model, matrix: model.score(matrix), self.models, matrices))
+        return matrices[0], EnsembleScores(self.names, scores)
@@ -0,0 +1,112 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy as np
+from scipy import sparse
+from .storage import iter_blocks
+
+
+def average_path_length(n_samples):
+    """Average path length of an unsuccessful search in a binary search tree of `n_samples` nodes, which
+    IsolationForest adds to the depth of leaves holding several training samples."""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.
+    large = n_samples > 2
+    lengths[large] = (2. * (np.log(n_samples[large] - 1.) + np.euler_gamma)
+                      - 2. * (n_samples[large] - 1.) / n_samples[large])
+    return lengths
+
+
+def path_lengths(model, matrix, estimators=None, block_size=65536):
+    """Sum over trees of the path length of every row, the quantity IsolationForest scores are derived from.
+
+      Parameters
+      ----------
+      model : IsolationForest
+          Fitted forest
+      matrix : numpy ndarray
+          Feature matrix, one row per host
+      estimators : slice, optional
+          Trees to walk, all of them by default
+
+      Returns
+      -------
+      lengths : numpy ndarray
+          Sum of the path lengths of every row over the walked trees
+    """
+    estimators = estimators or slice(None)
+    lengths = np.zeros(len(matrix))
+    for block in iter_blocks(len(matrix), block_size):
+        rows = np.asarray(matrix[block], dtype=np.float32)
+        for tree, features in zip(model.estimators_[estimators], model.estimators_features_[estimators]):
+            subset = rows[:, features]
+            leaves = tree.apply(subset)
+            depths = np.ravel(tree.decision_path(subset).sum(axis=1)) - 1.
+            lengths[block] += depths + average_path_length(tree.tree_.n_node_samples[leaves])
+    return lengths
+
+
+def anomaly_scores(model, lengths, n_estimators=None):
+    """Anomaly scores (the opposite of `score_samples`) from the summed path lengths of `n_estimators` trees."""
+    n_estimators = n_estimators or len(model.estimators_)
+    return 2. ** (-lengths / (n_estimators * average_path_length([model.max_samples_])[0]))
+
+
+def _split_gains(tree, features, n_features):
+    """Sparse (nodes x features) matrix crediting the split feature of every parent node with the path length saved by
+    moving to the child, c(parent samples) - 1 - c(child samples)."""
+    structure = tree.tree_
+    parents = np.flatnonzero(structure.children_left >= 0)
+    children = np.concatenate((structure.children_left[parents], structure.children_right[parents]))
+    parents = np.concatenate((parents, parents))
+    gains = (average_path_length(structure.n_node_samples[parents]) - 1.
+             - average_path_length(structure.n_node_samples[children]))
+    split_features = np.asarray(features)[structure.feature[parents]]
+    return sparse.csr_matrix((gains, (children, split_features)), shape=(structure.node_count, n_features))
+
+
+def path_contributions(model, matrix):
+    """Contribution of every feature to the isolation of every row, summed along its paths in the forest.
+
+    Every split on the path of a row is credited with the expected path length it saves, from the average path length
+    of the samples reaching the parent node to one more step plus the average path length of those reaching the child.
+    Along a path these gains add up to c(max_samples) - path length, so the contributions of a row sum to how much
+    faster than an average row it is isolated (on average over trees): the larger, the more anomalous. The paths of
+    all trees are stacked into one sparse indicator matrix, so that attribution is a single sparse product costing
+    about as much as scoring the rows.
+
+      Parameters
+      ----------
+      model : IsolationForest
+          Fitted forest
+      matrix : numpy ndarray
+          Feature matrix of the rows to explain, e.g. the top-N hosts
+
+      Returns
+      -------
+      contributions : numpy ndarray
+          Contribution of every feature (columns) to every row (rows)
+    """
+    rows = np.asarray(matrix, dtype=np.float32)
+    n_features = rows.shape[1]
+    paths, gains = [], []
+    for tree, features in zip(model.estimators_, model.estimators_features_):
+        paths.append(tree.decision_path(rows[:, features]))
+        gains.append(_split_gains(tree, features, n_features))
+    contributions = sparse.hstack(paths, format='csr') @ sparse.vstack(gains, format='csr')
+    return contributions.toarray() / len(model.estimators_)
@@ -0,0 +1,61 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import re
+from ipaddress import ip_address
+from .report import Host, Port
+
+
+PORT_SEPARATOR = re.compile(r', (?=\d+/)')
+
+
+class NmapGrepableParser:
+    """Line-oriented parser of nmap grepable output (-oG), keeping only the current host in memory."""
+
+    def load_hosts(self, file):
+        host = None
+        current_address = None
+        for line in file:
+            if not line.startswith('Host: '):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            address, _, hostname = fields[0][len('Host: '):].partition(' ')
+
+            if address != current_address:
+                if host is not None:
+                    yield host
+                current_address = address
+                address = ip_address(address)
+                host = Host(hostname=hostname.strip('()') or None, **{f'ipv{address.version}': address})
+
+            for field in fields[1:]:
+                name, _, value = field.partition(': ')
+                if name == 'Ports':
+                    host.ports.extend(self._parse_port(entry) for entry in PORT_SEPARATOR.split(value))
+                elif name == 'OS':
+                    host.os_info = {'name': value}
+        if host is not None:
+            yield host
+
+    def _parse_port(self, entry):
+        # port/state/protocol/owner/service/rpc info/version/
+        number, state, protocol, _, service, _, version = entry.split('/')[:7]
+        return Port(port=int(number),
+                    protocol=protocol or None,
+                    state=state or None,
+                    service=service or None,
+                    software=version or None)
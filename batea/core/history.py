@@ -0,0 +1,135 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import json
+import sqlite3
+from datetime import datetime, timezone
+import numpy as np
+from .baseline import rank_scores
+from .storage import iter_blocks
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    number_of_hosts INTEGER NOT NULL,
+    features TEXT NOT NULL,
+    inputs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    address TEXT NOT NULL,
+    score REAL NOT NULL,
+    rank INTEGER NOT NULL,
+    previous_rank INTEGER,
+    movement INTEGER,
+    features BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_address ON scores (address, run_id);
+CREATE INDEX IF NOT EXISTS scores_movement ON scores (run_id, movement);
+"""
+
+INSERT_BLOCK_SIZE = 65536
+
+
+class ScoreHistory:
+    """Scores, ranks and feature vectors of every run, kept in a local SQLite file.
+
+    Runs are written in a single transaction with bulk inserts. The rank of every host in the previous run and its
+    movement since are stored along with its score when the run is recorded, so that both the top movers of a run and
+    the history of an address are read from an index rather than joining runs of millions of hosts. Feature vectors
+    are stored as float32 blobs, the feature names of the run being kept once in the runs table.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, addresses, scores, matrix, features, inputs=()):
+        """Store a run and return its id.
+
+          Parameters
+          ----------
+          addresses : list
+              Address of every host, as a string
+          scores : numpy ndarray
+              Anomaly score of every host
+          matrix : numpy ndarray
+              Feature matrix, one row per host
+          features : list
+              Names of the matrix columns
+          inputs : list, optional
+              Names of the input files of the run
+        """
+        ranks = rank_scores(scores)
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (started_at, number_of_hosts, features, inputs) VALUES (?, ?, ?, ?)",
+                (datetime.now(timezone.utc).isoformat(), len(addresses), json.dumps(list(features)),
+                 json.dumps(list(inputs)))).lastrowid
+            previous = self._ranks(self.previous_run(run_id))
+
+            for block in iter_blocks(len(addresses), INSERT_BLOCK_SIZE):
+                vectors = np.asarray(matrix[block], dtype=np.float32)
+                rows = []
+                for i, vector in zip(range(block.start, block.stop), vectors):
+                    previous_rank = previous.get(addresses[i])
+                    rank = int(ranks[i])
+                    rows.append((run_id, addresses[i], float(scores[i]), rank, previous_rank,
+                                 previous_rank - rank if previous_rank is not None else None, vector.tobytes()))
+                self.connection.executemany("INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return run_id
+
+    def _ranks(self, run_id):
+        if run_id is None:
+            return {}
+        return dict(self.connection.execute("SELECT address, rank FROM scores WHERE run_id = ?", (run_id,)))
+
+    def last_run(self):
+        return self.connection.execute("SELECT MAX(id) FROM runs").fetchone()[0]
+
+    def previous_run(self, run_id):
+        return self.connection.execute("SELECT MAX(id) FROM runs WHERE id < ?", (run_id,)).fetchone()[0]
+
+    def top_movers(self, n=10, run_id=None):
+        """Hosts of a run (the last one by default) that climbed the most ranks since the previous run, towards the
+        most anomalous. Hosts missing from the previous run have no movement and are left out."""
+        run_id = self.last_run() if run_id is None else run_id
+        rows = self.connection.execute(
+            "SELECT address, score, rank, previous_rank, movement FROM scores "
+            "WHERE run_id = ? AND movement IS NOT NULL ORDER BY movement DESC LIMIT ?", (run_id, n))
+        return [{'host': address, 'score': score, 'rank': rank, 'previous_rank': previous_rank, 'movement': movement}
+                for address, score, rank, previous_rank, movement in rows]
+
+    def host_history(self, address):
+        """Score, rank and features of `address` in every run it was seen in, the oldest first."""
+        rows = self.connection.execute(
+            "SELECT runs.id, runs.started_at, runs.features, scores.score, scores.rank, scores.features "
+            "FROM scores JOIN runs ON runs.id = scores.run_id WHERE scores.address = ? ORDER BY scores.run_id",
+            (address,))
+        history = []
+        for run_id, started_at, names, score, rank, vector in rows:
+            values = np.frombuffer(vector, dtype=np.float32).tolist()
+            history.append({'run': run_id, 'started_at': started_at, 'score': score, 'rank': rank,
+                            'features': dict(zip(json.loads(names), values))})
+        return history
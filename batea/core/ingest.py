@@ -0,0 +1,141 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from defusedxml import ElementTree
+from xml.etree.ElementTree import ParseError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+READ_BUFFER_SIZE = 1 << 20
+
+# Bytes read at each end of a report to find its scaninfo and runstats headers
+RUNSTATS_SCAN_SIZE = 1 << 16
+SCANINFO_PATTERN = re.compile(rb'<scaninfo\s[^>]*\bnumservices="(\d+)"')
+RUNSTATS_PATTERN = re.compile(rb'<hosts\s[^>]*\bup="(\d+)"[^>]*\btotal="(\d+)"')
+
+PARSE_ERRORS = (ParseError, UnicodeDecodeError, ElementTree.ParseError, ValueError, EOFError, OSError,
+                lzma.LZMAError)
+
+
+def _open_zstd(file):
+    if zstandard is None:
+        raise ValueError("zstd compressed input requires the zstandard package")
+    return zstandard.ZstdDecompressor().stream_reader(file, read_size=READ_BUFFER_SIZE)
+
+
+DECOMPRESSORS = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+    (b'\x28\xb5\x2f\xfd', _open_zstd),
+]
+
+
+def open_input(file):
+    """Wrap a binary input file into a text stream, transparently decompressing gzip, bz2, xz and zstd content
+    detected by its magic bytes.
+
+      Parameters
+      ----------
+      file : binary file object
+          Plain or compressed report, e.g. opened with click.File('rb')
+
+      Returns
+      -------
+      stream : text file object
+          Decoded and decompressed content, read with large buffers
+    """
+    if hasattr(file, 'peek'):
+        head = file.peek(6)[:6]
+    else:
+        head = file.read(6)
+        file.seek(-len(head), io.SEEK_CUR)
+
+    for magic, decompress in DECOMPRESSORS:
+        if head.startswith(magic):
+            file = io.BufferedReader(decompress(file), buffer_size=READ_BUFFER_SIZE)
+            break
+    return io.TextIOWrapper(file, encoding='utf-8')
+
+
+def report_totals(file):
+    """Read the number of hosts and services of an uncompressed nmap XML report from its headers, without parsing
+    it: the services of the <scaninfo> elements at its start and the hosts of the <runstats> element at its end.
+    The position of the file is left unchanged.
+
+      Parameters
+      ----------
+      file : binary file object
+          Seekable nmap XML report
+
+      Returns
+      -------
+      totals : dict
+          Number of 'hosts' (up, i.e. listed in the report), of 'scanned' hosts and of 'services' per host, each
+          None when missing (e.g. from compressed, truncated or unseekable inputs)
+    """
+    totals = dict(hosts=None, scanned=None, services=None)
+    if not file.seekable():
+        return totals
+    position = file.tell()
+    try:
+        head = file.read(RUNSTATS_SCAN_SIZE)
+        if any(head.startswith(magic) for magic, _ in DECOMPRESSORS):
+            return totals
+        services = [int(n) for n in SCANINFO_PATTERN.findall(head)]
+        if services:
+            totals['services'] = sum(services)
+        size = file.seek(0, os.SEEK_END)
+        file.seek(max(size - RUNSTATS_SCAN_SIZE, 0))
+        runstats = RUNSTATS_PATTERN.search(file.read(RUNSTATS_SCAN_SIZE))
+        if runstats is not None:
+            totals['hosts'], totals['scanned'] = int(runstats.group(1)), int(runstats.group(2))
+    finally:
+        file.seek(position)
+    return totals
+
+
+def _parse_source(source):
+    parser, file = source
+    return list(parser.load_hosts(open_input(file)))
+
+
+def ingest(sources, workers=1):
+    """Yield the hosts of every (parser, binary file) source, in order.
+
+    With a single worker, files are streamed one after the other. With more workers, files are decompressed and
+    parsed concurrently by a thread pool: decompression releases the GIL, so it overlaps the parsing of other files.
+    """
+    if workers <= 1:
+        for parser, file in sources:
+            yield from parser.load_hosts(open_input(file))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for hosts in executor.map(_parse_source, sources):
+            yield from hosts
@@ -0,0 +1,85 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import json
+from ipaddress import ip_address
+from .report import Host, Port
+
+
+class MasscanParser:
+    """Line-oriented parser of masscan output, either JSON (-oJ or ndjson) or list (-oL) format.
+
+    Only the current host is kept in memory: a host is yielded as soon as a line of another address is read. Masscan
+    randomizes its scan order so the ports of a host are usually scattered, which is why the hosts of this parser
+    are meant to be combined with the host merge index.
+    """
+
+    def load_hosts(self, file):
+        host = None
+        current_address = None
+        for line in file:
+            record = self._parse_line(line)
+            if record is None:
+                continue
+            address, ports = record
+            if address != current_address:
+                if host is not None:
+                    yield host
+                current_address = address
+                host = self._new_host(ip_address(address))
+            host.ports.extend(ports)
+        if host is not None:
+            yield host
+
+    def _new_host(self, address):
+        if address.version == 4:
+            return Host(ipv4=address)
+        return Host(ipv6=address)
+
+    def _parse_line(self, line):
+        line = line.strip().strip(',')
+        if not line or line[0] in '#[]':
+            return None
+        if line[0] == '{':
+            return self._parse_json(json.loads(line))
+        return self._parse_list(line)
+
+    def _parse_list(self, line):
+        # open tcp 80 10.0.0.1 1600000000
+        # banner tcp 80 10.0.0.1 1600000000 http Apache/2.4.6 (CentOS)
+        fields = line.split(' ', 6)
+        if fields[0] == 'banner':
+            port = Port(port=int(fields[2]), protocol=fields[1], state='open',
+                        service=fields[5], software=fields[6] if len(fields) > 6 else None)
+        else:
+            port = Port(port=int(fields[2]), protocol=fields[1], state=fields[0])
+        return fields[3], [port]
+
+    def _parse_json(self, record):
+        # -oJ:     {"ip": "10.0.0.1", "ports": [{"port": 80, "proto": "tcp", "status": "open", ...}]}
+        # ndjson:  {"ip": "10.0.0.1", "port": 80, "proto": "tcp", "rec_type": "status", "data": {"status": "open"}}
+        if 'ports' in record:
+            ports = [self._json_port(entry, entry.get('status'), entry.get('service', {}).get('name'),
+                                     entry.get('service', {}).get('banner')) for entry in record['ports']]
+        else:
+            data = record.get('data', {})
+            ports = [self._json_port(record, data.get('status'), data.get('service_name'), data.get('banner'))]
+        return record['ip'], ports
+
+    def _json_port(self, entry, status, service, banner):
+        return Port(port=int(entry['port']), protocol=entry.get('proto'), state=status or 'open',
+                    service=service, software=banner)
@@ -0,0 +1,123 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import pickle
+import tempfile
+
+
+def port_richness(port):
+    """Ordering key of the information held by a port, open ports with identified software being the richest."""
+    details = [port.service, port.software, port.version, port.cpe, port.scripts]
+    return (port.state == 'open',
+            sum(1 for detail in details if detail not in [None, '', 'unknown']),
+            port.get_banner_length())
+
+
+def os_richness(os_info):
+    return (os_info or {}).get('accuracy', 0), len(os_info or {})
+
+
+class HostMerger:
+    """Merges the hosts found in several reports into a single host per address.
+
+    Hosts are indexed by address and ports by (port, protocol), so merging is linear in the total number of ports.
+    For each port, hostname or OS the richest data is kept. When `max_hosts` is set, the index is spilled to disk
+    partitioned by address whenever it grows past that size, and partitions are merged one at a time at the end,
+    bounding the memory used by the index.
+    """
+
+    def __init__(self, max_hosts=None, partitions=64, directory=None):
+        self.max_hosts = max_hosts
+        self.partitions = partitions
+        self.directory = directory
+        self._index = {}
+        self._spill_directory = None
+
+    def add(self, hosts):
+        for host in hosts:
+            self._merge(self._index, host)
+            if self.max_hosts is not None and len(self._index) > self.max_hosts:
+                self._spill()
+
+    def hosts(self):
+        """Yield the merged hosts, in order of first appearance unless the index was spilled to disk."""
+        if self._spill_directory is None:
+            for host, _ in self._index.values():
+                yield host
+            return
+
+        self._spill()
+        with self._spill_directory:
+            for partition in range(self.partitions):
+                index = {}
+                for host in self._load_partition(partition):
+                    self._merge(index, host)
+                for host, _ in index.values():
+                    yield host
+        self._spill_directory = None
+
+    def _merge(self, index, host):
+        key = host.address
+        if key not in index:
+            index[key] = (host, {(port.port, port.protocol): i for i, port in enumerate(host.ports)})
+            return
+
+        target, ports = index[key]
+        for port in host.ports:
+            i = ports.get((port.port, port.protocol))
+            if i is None:
+                ports[(port.port, port.protocol)] = len(target.ports)
+                target.ports.append(port)
+            elif port_richness(port) > port_richness(target.ports[i]):
+                target.ports[i] = port
+
+        target.ipv4 = target.ipv4 or host.ipv4
+        target.ipv6 = target.ipv6 or host.ipv6
+        target.hostname = target.hostname or host.hostname
+        target.metadata = {**host.metadata, **target.metadata}
+        if os_richness(host.os_info) > os_richness(target.os_info):
+            target.os_info = host.os_info
+
+    def _spill(self):
+        if self._spill_directory is None:
+            self._spill_directory = tempfile.TemporaryDirectory(dir=self.directory, prefix='batea-merge-')
+        files = [open(self._partition_path(partition), 'ab') for partition in range(self.partitions)]
+        try:
+            for key, (host, _) in self._index.items():
+                pickle.dump(host, files[hash(key) % self.partitions])
+        finally:
+            for file in files:
+                file.close()
+        self._index = {}
+
+    def _load_partition(self, partition):
+        with open(self._partition_path(partition), 'rb') as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    return
+
+    def _partition_path(self, partition):
+        return os.path.join(self._spill_directory.name, f"partition_{partition}")
+
+
+def merge_hosts(hosts, max_hosts=None):
+    merger = HostMerger(max_hosts=max_hosts)
+    merger.add(hosts)
+    return list(merger.hosts())
@@ -16,27 +16,226 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 from sklearn.ensemble import IsolationForest
+from sklearn.utils import check_random_state
+import hashlib
 import numpy as np
 import pickle
+from .storage import iter_blocks
+from .forest import path_lengths, anomaly_scores, path_contributions
+from .pruning import analyze_columns
+
+
+SCORE_BLOCK_SIZE = 65536
+CALIBRATION_LEVELS = np.linspace(0., 1., 1001)
+ADAPTIVE_PATIENCE = 2
 
 
 class BateaModel:
 
-    def __init__(self, model=None, report_features=None, model_features=None):
+    def __init__(self, model=None, report_features=None, model_features=None, statistics=None, columns=None,
+                 quantiles=None):
         self.model = model
         self.report_features = report_features
         self.mode_features = model_features
+        self.statistics = statistics or {}
+        # Indices of the matrix columns the forest is fitted on, all of them when None
+        self.columns = columns
+        # Training scores at CALIBRATION_LEVELS, None for models dumped before calibration
+        self.quantiles = quantiles
 
-    def build_model(self, outlier_ratio=0.1, n_estimators=100, max_samples='auto'):
+    def build_model(self, outlier_ratio=0.1, n_estimators=100, max_samples='auto', n_jobs=None, random_state=None):
         self.model = IsolationForest(contamination=outlier_ratio,
                                      n_estimators=n_estimators,
                                      max_samples=max_samples,
+                                     n_jobs=n_jobs,
+                                     random_state=random_state,
                                      behaviour='new')
 
+    def prune(self, matrix, near_constant=None):
+        """Exclude constant (optionally near-constant) and perfectly correlated columns from fitting and scoring.
+
+          Returns
+          -------
+          pruned : dict
+              Name of every dropped column to the reason it was dropped
+        """
+        self.columns, dropped = analyze_columns(matrix, near_constant=near_constant)
+        names = self.report_features or [str(i) for i in range(matrix.shape[1])]
+        pruned = {}
+        for i, reason in sorted(dropped.items()):
+            if reason.startswith('correlated:'):
+                reason = f"correlated with {names[int(reason.split(':')[1])]}"
+            pruned[names[i]] = reason
+        return pruned
+
+    def _project(self, rows):
+        return rows if self.columns is None else rows[:, self.columns]
+
+    def fit(self, matrix, sample_weight=None):
+        """Fit the model on the feature matrix.
+
+        IsolationForest path lengths only depend on how many training rows reach each node, so sample weights (e.g.
+        the counts of deduplicated rows) are honoured by fitting on a weighted resample large enough to feed every
+        tree its subsample, which keeps the density of repeated hosts without materializing all of them. Memory-mapped
+        matrices are likewise fitted on a uniform subsample of rows rather than loaded whole.
+
+          Parameters
+          ----------
+          matrix : numpy ndarray
+              Feature matrix, one row per host
+          sample_weight : numpy ndarray, optional
+              Number of hosts represented by each row
+        """
+        if sample_weight is None and not isinstance(matrix, np.memmap):
+            self.model.fit(self._project(matrix))
+            return self
+
+        n_samples = len(matrix) if sample_weight is None else int(np.sum(sample_weight))
+        max_samples = self.model.max_samples
+        if max_samples == 'auto':
+            max_samples = min(256, n_samples)
+        elif isinstance(max_samples, float):
+            max_samples = max(1, int(max_samples * n_samples))
+            self.model.set_params(max_samples=max_samples)
+
+        size = min(n_samples, max_samples * self.model.n_estimators)
+        random_state = check_random_state(self.model.random_state)
+        if sample_weight is None:
+            rows = random_state.choice(len(matrix), size=size, replace=False)
+        else:
+            rows = random_state.choice(len(matrix), size=size, p=sample_weight / n_samples)
+        self.model.fit(self._project(matrix[np.sort(rows)]))
+        return self
+
+    def fit_adaptive(self, matrix, n_top=5, batch_size=10, tolerance=0., max_estimators=1000, sample_weight=None):
+        """Grow the forest by batches of trees until the top-N ranking of the rows stops changing, then return the
+        anomaly score of every row.
+
+        Each batch is added to the forest with a warm start, and only the new trees are walked to update the summed
+        path lengths of the rows, which rank them exactly like the scores of the whole forest. The ranking has
+        converged once the share of the top-N replaced by a batch stays within `tolerance` for `ADAPTIVE_PATIENCE`
+        batches in a row, so easy networks stop after a few batches and hard ones keep growing up to
+        `max_estimators`. The contamination threshold is only computed once the forest is grown.
+
+          Parameters
+          ----------
+          matrix : numpy ndarray
+              Feature matrix, one row per host
+          n_top : int
+              Size of the ranking whose stability is tracked
+          batch_size : int
+              Number of trees added at once
+          tolerance : float
+              Share of the top-N allowed to change between converged batches
+          max_estimators : int
+              Upper bound on the number of trees
+          sample_weight : numpy ndarray, optional
+              Number of hosts represented by each row
+
+          Returns
+          -------
+          scores : numpy ndarray
+              Anomaly score of every row, the higher the more anomalous
+        """
+        contamination = self.model.contamination
+        self.model.set_params(warm_start=True, contamination='auto')
+        n_top = max(1, min(n_top, len(matrix)))
+        lengths = np.zeros(len(matrix))
+        projected = self._project(matrix)
+        previous, stable, n_estimators = None, 0, 0
+
+        while n_estimators < max_estimators and stable < ADAPTIVE_PATIENCE:
+            n_estimators = min(n_estimators + batch_size, max_estimators)
+            fitted = len(getattr(self.model, 'estimators_', []))
+            self.model.set_params(n_estimators=n_estimators)
+            self.fit(matrix, sample_weight=sample_weight)
+            lengths += path_lengths(self.model, projected, estimators=slice(fitted, None))
+
+            top = set(np.argsort(lengths, kind='stable')[:n_top].tolist())
+            if previous is not None and 1. - len(top & previous) / n_top <= tolerance:
+                stable += 1
+            else:
+                stable = 0
+            previous = top
+
+        scores = anomaly_scores(self.model, lengths)
+        self.model.set_params(warm_start=False, contamination=contamination)
+        if contamination != 'auto':
+            self.model.offset_ = np.percentile(-scores, 100. * contamination)
+        return scores
+
+    def score(self, matrix, out=None, block_size=SCORE_BLOCK_SIZE):
+        """Anomaly score of every row, the higher the more anomalous. Rows are scored by blocks, so that only one
+        block of a memory-mapped matrix is loaded (and converted by the forest) at a time.
+
+          Parameters
+          ----------
+          matrix : numpy ndarray
+              Feature matrix, one row per host
+          out : numpy ndarray, optional
+              Array receiving the scores, e.g. a memory-mapped score column
+          block_size : int
+              Number of rows scored at once
+        """
+        if out is None:
+            out = np.empty(len(matrix))
+        for block in iter_blocks(len(matrix), block_size):
+            out[block] = -self.model.score_samples(self._project(matrix[block]))
+        return out
+
+    def calibrate(self, scores):
+        """Keep the quantiles of the training scores, a fixed-size summary of their distribution."""
+        self.quantiles = np.quantile(scores, CALIBRATION_LEVELS)
+
+    def percentile(self, scores):
+        """Percentile of every score within the training score distribution, comparable across runs and models.
+        Scores are located among the stored quantiles by binary search and interpolated linearly."""
+        assert self.quantiles is not None, "Model has no training score quantiles, it must be retrained to calibrate"
+        return 100. * np.interp(scores, self.quantiles, CALIBRATION_LEVELS)
+
+    def explain(self, matrix):
+        """Contribution of every column of the matrix to the isolation of every row (see `path_contributions`),
+        pruned columns contributing nothing."""
+        contributions = np.zeros(matrix.shape)
+        contributions[:, self.columns if self.columns is not None else slice(None)] = \
+            path_contributions(self.model, self._project(matrix))
+        return contributions
+
     def load_model(self, model_file):
-        self.model, self.model_features = pickle.load(model_file)
+        data = pickle.load(model_file)
+        if isinstance(data, tuple):
+            # Models dumped before the feature statistics were stored along with them
+            data = {'model': data[0], 'features': data[1]}
+        self.model = data['model']
+        self.model_features = data['features']
+        self.statistics = data.get('statistics', {})
+        self.columns = data.get('columns')
+        self.quantiles = data.get('quantiles')
         assert self.model_features == self.report_features, \
             f"Model and data don't share matching features: {self.model_features} != {self.report_features}"
 
     def dump_model(self, dump_model):
-        pickle.dump((self.model, self.report_features), dump_model)
+        pickle.dump({'model': self.model,
+                     'features': self.report_features,
+                     'statistics': self.statistics,
+                     'columns': self.columns,
+                     'quantiles': self.quantiles}, dump_model)
+
+    def digest(self):
+        """Hash of the trees, feature statistics and columns of the model, identifying the model that produced a
+        matrix and its scores. Pickles of a model and of its loaded dump differ, so the trees are hashed from their
+        arrays. None for unfitted models."""
+        if self.model is None or not hasattr(self.model, 'estimators_'):
+            return None
+        digest = hashlib.blake2b(repr((self.report_features, sorted(self.statistics or {}))).encode(), digest_size=16)
+        for name in sorted(self.statistics or {}):
+            digest.update(pickle.dumps(self.statistics[name]))
+        if self.columns is not None:
+            digest.update(np.asarray(self.columns, dtype=np.int64).tobytes())
+        for estimator, features in zip(self.model.estimators_, self.model.estimators_features_):
+            tree = estimator.tree_
+            for array in (tree.children_left, tree.children_right, tree.feature, tree.threshold, tree.n_node_samples,
+                          features):
+                digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(np.float64(self.model.offset_).tobytes())
+        return digest.hexdigest()
@@ -18,10 +18,17 @@
 from defusedxml import ElementTree
 from ipaddress import ip_address
 from .report import Host, Port
+from .scripts import ScriptOutputs
 
 
 class NmapReportParser:
 
+    # NSE script outputs are only kept for the ids in `script_ids` (every script if None), by default none of them
+    script_ids = frozenset()
+
+    def __init__(self, script_ids=()):
+        self.script_ids = script_ids if script_ids is None else frozenset(script_ids)
+
     def load_hosts(self, file):
 
         root = ElementTree.parse(file).getroot()
@@ -32,13 +39,14 @@ class NmapReportParser:
 
     def _generate_host(self, subtree):
         return Host(ipv4=self._find_address(subtree),
+                    ipv6=self._find_address(subtree, addrtype="ipv6"),
                     hostname=self._find_hostname(subtree),
                     os_info=self._os_detection(subtree),
                     ports=self._find_ports(subtree))
 
-    def _find_address(self, host):
+    def _find_address(self, host, addrtype="ipv4"):
         for addr in host.findall('address'):
-            if addr.attrib["addrtype"] == "ipv4":
+            if addr.attrib["addrtype"] == addrtype:
                 return ip_address(addr.attrib["addr"])
 
     def _find_hostname(self, host):
@@ -62,12 +70,21 @@ class NmapReportParser:
                     service=service.attrib['name'] if service is not None else None,
                     software=service.attrib['product'] if service is not None and 'product' in service.attrib else None,
                     version=service.attrib['version'] if service is not None and 'version' in service.attrib else None,
-                    cpe=cpe.text if cpe is not None else None
+                    cpe=cpe.text if cpe is not None else None,
+                    scripts=self._find_scripts(port) if self.script_ids is None or self.script_ids else None
                 )
 
                 ports.append(port)
         return ports
 
+    def _find_scripts(self, port):
+        scripts = ScriptOutputs()
+        for script in port.findall('script'):
+            script_id = script.attrib.get('id')
+            if self.script_ids is None or script_id in self.script_ids:
+                scripts.add(script_id, ElementTree.tostring(script))
+        return scripts if len(scripts) > 0 else None
+
     def _os_detection(self, host):
 
         for os in host.findall('os'):
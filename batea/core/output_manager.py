@@ -18,6 +18,8 @@
 import json
 import numpy as np
 from sys import stderr
+from .quantization import QuantizedMatrix
+from .storage import iter_blocks
 
 
 class OutputManager:
@@ -37,6 +39,9 @@ class OutputManager:
     def log_empty_report(self):
         stderr.write("Empty report, can't predict. \nQuitting\n")
 
+    def log_error(self, message):
+        stderr.write(f"{message}\nQuitting\n")
+
     def _format(self, data):
         raise NotImplementedError()
 
@@ -61,47 +66,95 @@ class OutputManager:
                        }
         self._add_data('report_info', report_info)
 
-    def add_host_info(self, rank, score, host, features):
+    def add_host_info(self, rank, score, host, features, segment=None, contributions=None, models=None,
+                      aggregate=None, group=None, percentile=None):
         host_info = {
             'rank': rank,
-            'host': host.ipv4.exploded,
+            'host': str(host.address),
             }
+        if segment is not None:
+            host_info['segment'] = segment
+        if group is not None:
+            host_info['group'] = group
+        if percentile is not None:
+            host_info['percentile'] = percentile
+        if models is not None:
+            host_info['aggregate'] = aggregate
+            host_info['models'] = models
         if self.verbosity > 0:
             host_info['score'] = score
             host_info['hostname'] = host.hostname
             host_info['os'] = host.os_info
             host_info['features'] = features
+            if contributions is not None:
+                host_info['contributions'] = contributions
         if self.verbosity == 2:
             host_info['ports'] = sorted([self._add_port_info(port) for port in host.ports], key=lambda p: p['port'])
         self._add_data('host_info', host_info)
 
     def _add_port_info(self, port):
-        return port.__dict__
+        port_info = dict(port.__dict__)
+        if port.scripts is not None:
+            port_info['scripts'] = {script_id: port.script(script_id) for script_id in sorted(port.scripts.raw)}
+        return port_info
 
     def add_scores(self, scores):
         self.scores = scores
 
+    def add_model_settings(self, settings):
+        self.data['report_info'][-1]['model'] = settings
+
+    def add_shards_info(self, merged, number_of_shards):
+        self._add_data('report_info', {
+            'number_of_hosts': len(merged.scores),
+            'number_of_shards': number_of_shards,
+            'features': merged.features,
+        })
+
+    def add_score_distribution(self, distribution):
+        self._add_data('score_distribution', distribution)
+
+    def add_top_movers(self, movers):
+        self._add_data('top_movers', movers)
+
+    def add_host_history(self, address, history):
+        self._add_data('host_history', {'host': address, 'runs': history})
+
+    def add_changed_hosts(self, changes):
+        self._add_data('changed_hosts', changes)
+
 
 class JsonOutput(OutputManager):
 
     def _format(self, data):
-        print(json.dumps(data, indent=4))
+        print(json.dumps(data, indent=4), flush=True)
 
 
 class MatrixOutput(OutputManager):
 
-    def __init__(self, output_matrix):
+    block_size = 65536
+
+    def __init__(self, output_matrix, quantize=None):
         self.output_matrix = output_matrix
+        self.quantize = quantize
         super().__init__()
 
     def _format(self, data):
-        matrix_rep = np.append(self.report.generate_matrix_representation(),
-                               np.expand_dims(self.scores, axis=1),
-                               axis=1)
+        matrix_rep = self.report.matrix_representation
+        if matrix_rep is None:
+            matrix_rep = self.report.generate_matrix_representation()
         columns = self.report.get_feature_names() + ['anomaly_score']
 
-        np.savetxt(self.output_matrix,
-                   matrix_rep,
-                   delimiter=',',
-                   header=','.join(columns),
-                   comments="")
+        if self.quantize is not None:
+            # Quantized column by column from views of the matrix, which is never copied whole
+            arrays = [matrix_rep[:, j] for j in range(matrix_rep.shape[1])] + [self.scores]
+            QuantizedMatrix.from_columns(arrays, len(matrix_rep), self.quantize, columns).save(self.output_matrix)
+            return
+
+        # Written by blocks of rows so that a memory-mapped matrix is never copied whole
+        for i, block in enumerate(iter_blocks(len(matrix_rep), self.block_size)):
+            np.savetxt(self.output_matrix,
+                       np.column_stack((matrix_rep[block], self.scores[block].astype(matrix_rep.dtype, copy=False))),
+                       delimiter=',',
+                       header=','.join(columns) if i == 0 else '',
+                       comments="")
@@ -18,7 +18,6 @@
 from .report import Host, Port, NmapReport
 from .model import BateaModel
 from ipaddress import ip_address
-import numpy as np
 import pandas as pd
 
 from ..features.basic_features import TotalPortCountFeature, OpenPortCountFeature, IpOctetFeature
@@ -83,11 +82,9 @@ class PandasBatea:
         report_features = self.report.get_feature_names()
         batea = BateaModel(report_features=report_features)
         batea.build_model()
-        batea.model.fit(matrix_rep)
-        scores = -batea.model.score_samples(matrix_rep)
-        matrix_rep = np.append(self.report.generate_matrix_representation(),
-                               np.expand_dims(scores, axis=1),
-                               axis=1)
-        columns = self.report.get_feature_names() + ['anomaly_score']
+        batea.fit(matrix_rep)
+        scores = batea.score(matrix_rep)
+        df = pd.DataFrame(matrix_rep, columns=self.report.get_feature_names())
+        df['anomaly_score'] = scores.astype(matrix_rep.dtype, copy=False)
 
-        return pd.DataFrame(matrix_rep, columns=columns)
+        return df
@@ -0,0 +1,191 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import heapq
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from ipaddress import ip_address
+from sklearn.base import clone
+from .model import BateaModel
+from .storage import open_array
+
+
+NORMALIZATION_SAMPLE_SIZE = 10000
+
+
+def group_key(spec):
+    """Return a function mapping a host to the key of its group.
+
+      Parameters
+      ----------
+      spec : str
+          A CIDR prefix length such as `/24`, applied to the address of the host (capped to 32 bits for IPv4),
+          `domain` for the domain of the hostname, `os` for the OS family (or name, for csv inputs), or the name of
+          a CSV column kept in the host metadata
+
+      Returns
+      -------
+      f : function
+          Hashable key of the host's group
+    """
+    if spec.startswith('/'):
+        prefix = int(spec[1:])
+
+        def f(host):
+            address = host.address
+            length = min(prefix, address.max_prefixlen)
+            return address.version, int(address) >> (address.max_prefixlen - length), length
+        return f
+
+    if spec == 'domain':
+        return lambda host: (host.hostname.lower().partition('.')[2] or None) if host.hostname else None
+
+    if spec == 'os':
+        return lambda host: (host.os_info.get('family') or host.os_info.get('name')) if host.os_info else None
+
+    return lambda host: host.metadata.get(spec)
+
+
+def format_key(key):
+    if isinstance(key, tuple):
+        version, network, length = key
+        max_prefixlen = 32 if version == 4 else 128
+        return f"{ip_address(network << (max_prefixlen - length))}/{length}"
+    return key
+
+
+def partition_hosts(hosts, spec):
+    """Group host indices by key, in order of first appearance.
+
+      Returns
+      -------
+      partitions : dict
+          Formatted group key to the array of row indices of its hosts
+    """
+    key = group_key(spec)
+    groups = {}
+    for i, host in enumerate(hosts):
+        groups.setdefault(key(host), []).append(i)
+    return {format_key(k): np.array(rows, dtype=np.int64) for k, rows in groups.items()}
+
+
+def top_per_group(hosts, scores, spec, n):
+    """Top `n` hosts of every group in a single pass, keeping one bounded heap of at most `n` rows per group.
+
+      Parameters
+      ----------
+      hosts : list
+          Hosts of the report
+      scores : numpy ndarray
+          Anomaly score of every host
+      spec : str
+          Group key, as accepted by `group_key`
+      n : int
+          Number of hosts kept per group
+
+      Returns
+      -------
+      groups : list
+          Pairs of formatted group key and row indices of its top hosts (the most anomalous first), the group holding
+          the most anomalous host first
+    """
+    key = group_key(spec)
+    heaps = {}
+    for i, host in enumerate(hosts):
+        heap = heaps.setdefault(key(host), [])
+        # Ties keep the first rows, whose negated index is larger
+        entry = (scores[i], -i)
+        if len(heap) < n:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    groups = [(format_key(k), [-i for _, i in sorted(heap, reverse=True)]) for k, heap in heaps.items() if heap]
+    return sorted(groups, key=lambda group: scores[group[1][0]], reverse=True)
+
+
+def normalize_scores(scores, reference=None):
+    """Standardize scores against the distribution of `reference` (defaults to the scores themselves), so that the
+    scores of models trained on different segments can be ranked together."""
+    if reference is None:
+        reference = scores
+    std = np.std(reference)
+    return (scores - np.mean(reference)) / std if std > 0 else np.zeros_like(scores)
+
+
+def _build(model):
+    if model is None:
+        batea = BateaModel()
+        batea.build_model()
+        return batea
+    return BateaModel(model=clone(model))
+
+
+def _fit_score_segment(task):
+    source, rows, model = task
+    matrix = open_array(source)[rows] if isinstance(source, str) else source
+    batea = _build(model)
+    batea.fit(matrix)
+    return normalize_scores(batea.score(matrix))
+
+
+def score_partitions(matrix, partitions, min_size=256, workers=None, model=None):
+    """Train and score one model per segment in a process pool, returning scores normalized within each segment.
+
+    Memory-mapped matrices are shared with the workers through their file, which each worker maps read-only; other
+    matrices are sent to the workers one segment at a time. Rows of segments smaller than `min_size` are scored by a
+    global model trained on every host, normalized against a sample of the global score distribution.
+
+      Parameters
+      ----------
+      matrix : numpy ndarray
+          Feature matrix of the report
+      partitions : dict
+          Segment key to row indices, as returned by `partition_hosts`
+      min_size : int
+          Minimum number of hosts for a segment to get its own model
+      workers : int, optional
+          Size of the process pool, defaults to the number of CPUs
+      model : IsolationForest, optional
+          Unfitted estimator cloned for every segment, defaults to the one of `BateaModel.build_model`
+
+      Returns
+      -------
+      scores : numpy ndarray
+          Normalized score of every row
+    """
+    scores = np.empty(len(matrix))
+    segments = [rows for rows in partitions.values() if len(rows) >= min_size]
+    fallback = [rows for rows in partitions.values() if len(rows) < min_size]
+
+    shared = matrix.filename if isinstance(matrix, np.memmap) else None
+    tasks = [(shared, rows, model) if shared else (matrix[rows], None, model) for rows in segments]
+    if segments:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(segments))) as executor:
+            for rows, segment_scores in zip(segments, executor.map(_fit_score_segment, tasks)):
+                scores[rows] = segment_scores
+
+    if fallback:
+        rows = np.concatenate(fallback)
+        batea = _build(model)
+        batea.fit(matrix)
+        sample = np.random.RandomState(0).choice(len(matrix), min(len(matrix), NORMALIZATION_SAMPLE_SIZE),
+                                                 replace=False)
+        scores[rows] = normalize_scores(batea.score(matrix[rows]), reference=batea.score(matrix[np.sort(sample)]))
+
+    return scores
@@ -0,0 +1,81 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+import sys
+import time
+from contextlib import contextmanager
+
+
+PROGRESS_INTERVAL = 5.
+# Items tracked between two clock reads, so that the hot loop only pays for a counter
+PROGRESS_CHECK_EVERY = 256
+
+
+class Progress:
+    """Throughput and ETA of the stages of a run, reported on stderr.
+
+    A disabled instance (the default) reports nothing and returns tracked iterables untouched, so that it costs
+    nothing when progress isn't requested.
+    """
+
+    def __init__(self, enabled=False, interval=PROGRESS_INTERVAL, stream=None):
+        self.enabled = enabled
+        self.interval = interval
+        self.stream = stream
+
+    def message(self, message):
+        if self.enabled:
+            stream = self.stream or sys.stderr
+            stream.write(f"{message}\n")
+            stream.flush()
+
+    def track(self, items, stage, total=None):
+        """Yield `items`, reporting the number of items, the throughput and, given their `total`, the ETA of the
+        stage every `interval` seconds and when it ends."""
+        if not self.enabled:
+            return items
+        return self._track(items, stage, total)
+
+    def _track(self, items, stage, total):
+        start = last = time.monotonic()
+        count = 0
+        for item in items:
+            yield item
+            count += 1
+            if count % PROGRESS_CHECK_EVERY == 0:
+                now = time.monotonic()
+                if now - last >= self.interval:
+                    self.message(self._status(stage, count, total, now - start))
+                    last = now
+        self.message(self._status(stage, count, None, time.monotonic() - start, done=True))
+
+    @contextmanager
+    def stage(self, stage, count):
+        """Report the duration and throughput of a stage processing `count` hosts at once."""
+        start = time.monotonic()
+        yield
+        if self.enabled:
+            self.message(self._status(stage, count, None, time.monotonic() - start, done=True))
+
+    @staticmethod
+    def _status(stage, count, total, elapsed, done=False):
+        rate = count / elapsed if elapsed > 0 else float('inf')
+        status = f"{stage}: {count}" + (f"/{total}" if total else "") + f" hosts, {rate:.0f} hosts/s"
+        if done:
+            return f"{status}, done in {elapsed:.1f}s"
+        if total and rate > 0 and count < total:
+            return f"{status}, ETA {(total - count) / rate:.0f}s"
+        return status
@@ -0,0 +1,105 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy as np
+from .storage import iter_blocks
+
+
+PRUNING_BLOCK_SIZE = 65536
+CORRELATION_TOLERANCE = 1e-9
+
+
+def column_moments(matrix, block_size=PRUNING_BLOCK_SIZE):
+    """Minimum, maximum, mean and co-moment matrix of the columns, in one pass over blocks of rows.
+
+    Block co-moments are computed around the block means and combined pairwise (Chan et al.), which keeps them exact
+    for columns of large values such as address octets.
+    """
+    n_columns = matrix.shape[1]
+    minimum = np.full(n_columns, np.inf)
+    maximum = np.full(n_columns, -np.inf)
+    mean = np.zeros(n_columns)
+    comoment = np.zeros((n_columns, n_columns))
+    count = 0
+    for block in iter_blocks(len(matrix), block_size):
+        rows = np.asarray(matrix[block], dtype=np.float64)
+        minimum = np.minimum(minimum, rows.min(axis=0))
+        maximum = np.maximum(maximum, rows.max(axis=0))
+        block_mean = rows.mean(axis=0)
+        centered = rows - block_mean
+        delta = block_mean - mean
+        total = count + len(rows)
+        comoment += centered.T @ centered + np.outer(delta, delta) * count * len(rows) / total
+        mean += delta * len(rows) / total
+        count = total
+    return minimum, maximum, mean, comoment
+
+
+def dominant_share(matrix, minimum, maximum, block_size=PRUNING_BLOCK_SIZE):
+    """Share of the rows holding the minimum or the maximum of their column, whichever is larger. For flags and counts
+    the dominant value of a column is one of its extremes."""
+    at_minimum = np.zeros(matrix.shape[1])
+    at_maximum = np.zeros(matrix.shape[1])
+    for block in iter_blocks(len(matrix), block_size):
+        rows = np.asarray(matrix[block], dtype=np.float64)
+        at_minimum += (rows == minimum).sum(axis=0)
+        at_maximum += (rows == maximum).sum(axis=0)
+    return np.maximum(at_minimum, at_maximum) / max(len(matrix), 1)
+
+
+def analyze_columns(matrix, near_constant=None):
+    """Find the columns that can't help the forest isolate rows.
+
+      Parameters
+      ----------
+      matrix : numpy ndarray
+          Feature matrix, one row per host
+      near_constant : float, optional
+          Share of the rows above which a column holding a single dominant value is dropped. Disabled by default,
+          rare values of a flag being what makes a host anomalous.
+
+      Returns
+      -------
+      columns : numpy ndarray
+          Indices of the kept columns, at least one
+      dropped : dict
+          Index of every dropped column to the reason it was dropped
+    """
+    minimum, maximum, _, comoment = column_moments(matrix)
+    dropped = {int(i): 'constant' for i in np.flatnonzero(minimum == maximum)}
+
+    if near_constant is not None and len(matrix) > 0:
+        share = dominant_share(matrix, minimum, maximum)
+        dropped.update({int(i): 'near-constant' for i in np.flatnonzero(share >= near_constant) if i not in dropped})
+
+    std = np.sqrt(np.diag(comoment))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.abs(comoment / np.outer(std, std))
+    kept = []
+    for i in range(matrix.shape[1]):
+        if i in dropped:
+            continue
+        duplicates = [k for k in kept if correlation[i, k] >= 1. - CORRELATION_TOLERANCE]
+        if duplicates:
+            dropped[i] = f'correlated:{duplicates[0]}'
+        else:
+            kept.append(i)
+    if not kept and matrix.shape[1] > 0:
+        # Every column is constant, the first one is kept so that a forest can still be fitted (scoring rows alike)
+        del dropped[0]
+        kept = [0]
+    return np.array(kept, dtype=np.int64), dropped
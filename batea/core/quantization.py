@@ -0,0 +1,72 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy as np
+
+
+class QuantizedMatrix:
+    """Compact storage of a feature matrix as unsigned integer codes with a per-column scale and offset.
+
+    Columns holding integers within the range of the code type (counts, octets, flags) are stored losslessly with a
+    scale of 1; other columns (e.g. entropies) are spread over the full code range, with an error of at most half
+    their scale.
+    """
+
+    def __init__(self, codes, scale, offset, columns=None):
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+        self.columns = list(columns) if columns is not None else None
+
+    @classmethod
+    def from_matrix(cls, matrix, dtype=np.uint16, columns=None):
+        return cls.from_columns([matrix[:, j] for j in range(matrix.shape[1])], len(matrix), dtype, columns)
+
+    @classmethod
+    def from_columns(cls, arrays, n_rows, dtype=np.uint16, columns=None):
+        """Quantize a matrix given as a list of column arrays (e.g. views of a memory-mapped matrix and an extra
+        column), one column at a time so that only the codes and the temporaries of one column are allocated."""
+        levels = np.iinfo(dtype).max
+        codes = np.empty((n_rows, len(arrays)), dtype=dtype)
+        scale = np.ones(len(arrays), dtype=np.float64)
+        offset = np.zeros(len(arrays), dtype=np.float64)
+        for j, column in enumerate(arrays):
+            if n_rows > 0:
+                offset[j] = column.min()
+                span = float(column.max()) - offset[j]
+                if span > 0 and (span > levels or not np.all(column == np.round(column))):
+                    scale[j] = span / levels
+            values = np.subtract(column, offset[j], dtype=np.float64)
+            values /= scale[j]
+            np.rint(values, out=codes[:, j], casting='unsafe')
+        return cls(codes, scale, offset, columns)
+
+    def to_matrix(self, dtype=np.float32):
+        """Decode the matrix, allocating only the returned array of the requested dtype."""
+        matrix = self.codes.astype(dtype)
+        matrix *= self.scale.astype(dtype)
+        matrix += self.offset.astype(dtype)
+        return matrix
+
+    def save(self, file):
+        np.savez_compressed(file, codes=self.codes, scale=self.scale, offset=self.offset,
+                            columns=np.array(self.columns or [], dtype=str))
+
+    @classmethod
+    def load(cls, file):
+        data = np.load(file, allow_pickle=False)
+        return cls(data['codes'], data['scale'], data['offset'], data['columns'] if len(data['columns']) else None)
@@ -15,14 +15,18 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import hashlib
 import numpy as np
+from .addresses import AddressArray
 
 
 class NmapReport:
 
-    def __init__(self):
+    def __init__(self, dtype=np.float64, store=None):
         self.hosts = []
         self.matrix_representation = None
+        self.dtype = np.dtype(dtype)
+        self.store = store
         self._features = []
 
     def add_feature(self, feature):
@@ -36,26 +40,117 @@ class NmapReport:
             yield feature
 
     def get_feature_names(self):
-        return [feature.name for feature in self._features]
+        return [name for feature in self._features for name in feature.get_column_names()]
 
-    def generate_matrix_representation(self):
-        rep = np.empty(shape=(len(self.hosts), len(self._features)))
-        for col, feature in enumerate(self._features):
-            rep[:, col] = feature.transform(self.hosts)
+    def get_script_ids(self):
+        """Ids of the NSE scripts whose output is used by the features, the only ones parsers need to keep."""
+        return {script_id for feature in self._features for script_id in feature.script_ids}
+
+    def _columns(self):
+        """Yield every feature along with the slice of the matrix columns it generates."""
+        col = 0
+        for feature in self._features:
+            width = len(feature.get_column_names())
+            yield feature, slice(col, col + width)
+            col += width
+
+    def fit_features(self):
+        """Compute the corpus statistics of every feature from the hosts of the report."""
+        for feature in self._features:
+            feature.fit(self.hosts)
+
+    def update_features(self, hosts):
+        for feature in self._features:
+            feature.update(hosts)
+
+    def forget_features(self, hosts):
+        for feature in self._features:
+            feature.forget(hosts)
+
+    def get_statistics(self):
+        return {feature.name: feature.statistics for feature in self._features if feature.statistics is not None}
+
+    def set_statistics(self, statistics):
+        for feature in self._features:
+            feature.statistics = statistics.get(feature.name)
+
+    def merge(self, other):
+        """Add the hosts of `other` to the report. Feature statistics are merged rather than recomputed, both reports
+        must have been built with the same features. Features of an unfitted report keep using the hosts as context."""
+        self.hosts.extend(other.hosts)
+        for feature, other_feature in zip(self._features, other.get_features()):
+            if feature.statistics is None:
+                continue
+            if other_feature.statistics is not None:
+                feature.statistics = feature.statistics.merge(other_feature.statistics)
+            else:
+                feature.update(other.hosts)
+
+    def generate_matrix_representation(self, hosts=None):
+        """Build the feature matrix of `hosts` (defaults to every host of the report). Context dependent features
+        are always computed against the whole report. The matrix of the whole report is memory-mapped to the backing
+        store, if any."""
+        shape = (len(self.hosts if hosts is None else hosts), len(self.get_feature_names()))
+        if hosts is None and self.store is not None:
+            rep = self.store.allocate_matrix(shape, self.dtype)
+        else:
+            rep = np.empty(shape=shape, dtype=self.dtype)
+        if hosts is None:
+            hosts = self.hosts
+        addresses = AddressArray.from_hosts(hosts)
+        for feature, cols in self._columns():
+            if feature.address_based:
+                column = feature.transform(hosts, addresses=addresses)
+            else:
+                column = feature.transform(hosts, context=self.hosts)
+            rep[:, cols] = np.reshape(column, (len(hosts), cols.stop - cols.start))
+        return rep
+
+    def update_context_columns(self, rep):
+        """Recompute in place the columns of context dependent features, for a matrix whose rows follow
+        `self.hosts`. Other columns only depend on their own host and are left untouched."""
+        for feature, cols in self._columns():
+            if feature.context_dependent:
+                rep[:, cols] = np.reshape(feature.transform(self.hosts), (len(self.hosts), cols.stop - cols.start))
+        return rep
+
+    def update_feature_columns(self, rep, names):
+        """Recompute in place the columns of the features named in `names` (e.g. the features whose statistics
+        changed), for a matrix whose rows follow `self.hosts`."""
+        for feature, cols in self._columns():
+            if feature.name in names:
+                rep[:, cols] = np.reshape(feature.transform(self.hosts), (len(self.hosts), cols.stop - cols.start))
         return rep
 
 
 class Host:
 
-    def __init__(self, ipv4=None, hostname=None, os_info=None, ports=None):
+    def __init__(self, ipv4=None, hostname=None, os_info=None, ports=None, ipv6=None, metadata=None):
         self.ipv4 = ipv4
+        self.ipv6 = ipv6
         self.hostname = hostname
         self.os_info = os_info
         self.ports = ports or []
+        self.metadata = metadata or {}
+
+    @property
+    def address(self):
+        """The address identifying the host, IPv4 for dual-stack hosts."""
+        return self.ipv4 if self.ipv4 is not None else self.ipv6
 
     def add_port(self, port):
         self.ports.append(port)
 
+    def fingerprint(self):
+        """Stable 64 bits hash of the hostname, OS and port attributes, used to detect hosts that changed between
+        two scans of the same address."""
+        ports = sorted((port.port, port.protocol or '', port.state or '', port.service or '',
+                        port.software or '', port.version or '', port.cpe or '')
+                       + (tuple(sorted(port.scripts.raw.items())) if port.scripts else ()) for port in self.ports)
+        os_info = sorted((self.os_info or {}).items(), key=lambda item: item[0])
+        data = repr((self.hostname, os_info, ports)).encode()
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
 
 class Port:
 
@@ -72,3 +167,7 @@ class Port:
 
     def get_banner_length(self):
         return len(self.software) if self.software else 0
+
+    def script(self, script_id):
+        """Parsed output of an NSE script run against the port, None if it didn't run or wasn't kept."""
+        return self.scripts.get(script_id) if self.scripts is not None else None
@@ -0,0 +1,75 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+from defusedxml import ElementTree
+
+
+def parse_script(raw):
+    """Flatten the structured output of an NSE script into a dictionary. Nested tables are joined by dots in the
+    keys (e.g. 'validity.notAfter' for ssl-cert), entries without a key are named after their position and the
+    human readable output of the script is kept under 'output'.
+
+      Parameters
+      ----------
+      raw : bytes
+          The XML of a <script> element
+
+      Returns
+      -------
+      values : dict
+          Text of every element of the script output, by key
+    """
+    script = ElementTree.fromstring(raw)
+    values = {'output': script.attrib.get('output', '')}
+    _flatten(script, '', values)
+    return values
+
+
+def _flatten(element, prefix, values):
+    for i, child in enumerate(element):
+        key = prefix + child.attrib.get('key', str(i))
+        if child.tag == 'table':
+            _flatten(child, key + '.', values)
+        elif child.tag == 'elem':
+            values[key] = child.text or ''
+
+
+class ScriptOutputs:
+    """Raw XML of the NSE scripts run against a port, by script id.
+
+    Outputs are kept as bytes and only parsed when a feature asks for them, so that reports scanned with -sC or -A
+    don't hold the element trees of every script in memory.
+    """
+
+    def __init__(self, raw=None):
+        self.raw = dict(raw or {})
+
+    def add(self, script_id, raw):
+        self.raw[script_id] = raw
+
+    def get(self, script_id):
+        """Parsed output of the script (see `parse_script`), None if it didn't run against the port."""
+        raw = self.raw.get(script_id)
+        return parse_script(raw) if raw is not None else None
+
+    def __contains__(self, script_id):
+        return script_id in self.raw
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __eq__(self, other):
+        return isinstance(other, ScriptOutputs) and self.raw == other.raw
@@ -0,0 +1,115 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import heapq
+import numpy as np
+
+
+HISTOGRAM_BINS = 100
+HISTOGRAM_EDGES = np.linspace(0., 1., HISTOGRAM_BINS + 1)
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+class ShardResult:
+    """Partial result of scoring a subset of the hosts with a pretrained model: the top-K hosts, a histogram of the
+    scores and the score of every host, which any number of shards can be merged into.
+
+    Rows scored with a pretrained model only depend on its frozen feature statistics, so scores are the same whatever
+    the shard a host lands in. The merged top-N is therefore exact as long as N does not exceed the top-K kept by each
+    shard, and the histogram bins are fixed over the range of IsolationForest scores so that they add up.
+    """
+
+    def __init__(self, features, top_addresses, top_hostnames, top_scores, top_matrix, histogram, addresses, scores):
+        self.features = list(features)
+        self.top_addresses = list(top_addresses)
+        self.top_hostnames = list(top_hostnames)
+        self.top_scores = np.asarray(top_scores, dtype=np.float64)
+        self.top_matrix = top_matrix
+        self.histogram = np.asarray(histogram, dtype=np.int64)
+        self.addresses = list(addresses)
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+    @property
+    def top_k(self):
+        return len(self.top_scores)
+
+    @classmethod
+    def from_report(cls, report, matrix, scores, top_k=100):
+        top = np.argsort(scores, kind='stable')[::-1][:top_k]
+        return cls(features=report.get_feature_names(),
+                   top_addresses=[str(report.hosts[i].address) for i in top],
+                   top_hostnames=[report.hosts[i].hostname or '' for i in top],
+                   top_scores=scores[top],
+                   top_matrix=np.asarray(matrix[top], dtype=np.float64),
+                   histogram=np.histogram(scores, bins=HISTOGRAM_EDGES)[0],
+                   addresses=[str(host.address) for host in report.hosts],
+                   scores=scores)
+
+    @classmethod
+    def merge(cls, results):
+        """Combine shard results into the result of scoring all of their hosts at once. The merged top is only exact
+        down to the smallest top-K of the shards that left hosts out of their top, it is cut there."""
+        results = list(results)
+        features = results[0].features
+        for result in results[1:]:
+            assert result.features == features, \
+                f"Shards don't share matching features: {result.features} != {features}"
+
+        entries = ((result.top_scores[i], result, i) for result in results for i in range(result.top_k))
+        top_k = min((result.top_k for result in results if result.top_k < len(result.scores)),
+                    default=sum(result.top_k for result in results))
+        top = heapq.nlargest(top_k, entries, key=lambda entry: entry[0])
+        return cls(features=features,
+                   top_addresses=[result.top_addresses[i] for _, result, i in top],
+                   top_hostnames=[result.top_hostnames[i] for _, result, i in top],
+                   top_scores=[score for score, _, _ in top],
+                   top_matrix=np.array([result.top_matrix[i] for _, result, i in top]).reshape(-1, len(features)),
+                   histogram=np.sum([result.histogram for result in results], axis=0),
+                   addresses=[address for result in results for address in result.addresses],
+                   scores=np.concatenate([result.scores for result in results]))
+
+    def distribution(self):
+        return {
+            'number_of_hosts': len(self.scores),
+            'mean': float(np.mean(self.scores)) if len(self.scores) else None,
+            'quantiles': {str(q): float(np.quantile(self.scores, q)) for q in QUANTILES} if len(self.scores) else {},
+            'bin_edges': HISTOGRAM_EDGES.tolist(),
+            'counts': self.histogram.tolist(),
+        }
+
+    @classmethod
+    def load(cls, file):
+        data = np.load(file, allow_pickle=False)
+        return cls(features=data['features'],
+                   top_addresses=data['top_addresses'],
+                   top_hostnames=data['top_hostnames'],
+                   top_scores=data['top_scores'],
+                   top_matrix=data['top_matrix'],
+                   histogram=data['histogram'],
+                   addresses=data['addresses'],
+                   scores=data['scores'])
+
+    def save(self, file):
+        np.savez_compressed(file,
+                            features=np.array(self.features, dtype=str),
+                            top_addresses=np.array(self.top_addresses, dtype=str),
+                            top_hostnames=np.array(self.top_hostnames, dtype=str),
+                            top_scores=self.top_scores,
+                            top_matrix=self.top_matrix,
+                            histogram=self.histogram,
+                            addresses=np.array(self.addresses, dtype=str),
+                            scores=self.scores)
@@ -0,0 +1,66 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import numpy as np
+
+
+MATRIX_FILENAME = "matrix.npy"
+SCORES_FILENAME = "scores.npy"
+
+
+def allocate_array(shape, dtype=np.float64, path=None):
+    """Allocate an array in memory or, when `path` is given, as a memory-mapped .npy file.
+
+    File-backed matrices are stored in column-major order so that features, which are computed column by column,
+    write sequentially to the file.
+    """
+    if path is None:
+        return np.empty(shape=shape, dtype=dtype)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape, fortran_order=len(shape) > 1)
+
+
+def open_array(path, mode='r'):
+    """Map an array written by `allocate_array`, read-only by default so it can be shared between processes."""
+    return np.load(path, mmap_mode=mode)
+
+
+def iter_blocks(length, block_size):
+    for start in range(0, length, block_size):
+        yield slice(start, min(start + block_size, length))
+
+
+class BackingStore:
+    """Directory holding the memory-mapped feature matrix and score column of a report."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.directory, MATRIX_FILENAME)
+
+    @property
+    def scores_path(self):
+        return os.path.join(self.directory, SCORES_FILENAME)
+
+    def allocate_matrix(self, shape, dtype):
+        return allocate_array(shape, dtype, self.matrix_path)
+
+    def allocate_scores(self, length):
+        return allocate_array((length,), np.float64, self.scores_path)
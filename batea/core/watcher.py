@@ -0,0 +1,101 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import numpy as np
+from .ingest import open_input, PARSE_ERRORS
+
+
+class DirectoryWatcher:
+    """Keeps a report and its matrix representation in sync with the files of a spool directory.
+
+    Files are identified by path and considered modified when their size or modification time changes. Only new and
+    modified files are parsed, and only their rows are computed. Feature statistics are updated with the hosts of
+    those files only (unless frozen, e.g. when scoring with a pretrained model), then columns of context dependent
+    features are refreshed for the whole report.
+    """
+
+    def __init__(self, directory, report, parser, update_statistics=True):
+        self.directory = directory
+        self.report = report
+        self.parser = parser
+        self.update_statistics = update_statistics
+        self.matrix_representation = None
+        self._signatures = {}
+        self._hosts = {}
+        self._rows = {}
+
+    def poll(self):
+        """Scan the directory once and ingest new, modified and removed files.
+
+          Returns
+          -------
+          changed : list
+              Paths of the files that were ingested or dropped during this poll
+        """
+        parsed = {}
+        seen = set()
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            seen.add(entry.path)
+            stat = entry.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self._signatures.get(entry.path) == signature:
+                continue
+            try:
+                with open(entry.path, 'rb') as file:
+                    hosts = list(self.parser.load_hosts(open_input(file)))
+            except PARSE_ERRORS:
+                # Most likely still being written by the scanner, retry on the next poll.
+                continue
+            self._signatures[entry.path] = signature
+            parsed[entry.path] = hosts
+
+        removed = [path for path in self._signatures if path not in seen]
+        for path in removed:
+            del self._signatures[path]
+            del self._rows[path]
+            self._forget(self._hosts.pop(path))
+
+        if parsed or removed:
+            for path, hosts in parsed.items():
+                if path in self._hosts:
+                    self._forget(self._hosts[path])
+                if self.update_statistics:
+                    self.report.update_features(hosts)
+            self._hosts.update(parsed)
+            self._update_matrix(parsed)
+
+        return list(parsed) + removed
+
+    def _forget(self, hosts):
+        if self.update_statistics:
+            self.report.forget_features(hosts)
+
+    def _update_matrix(self, parsed):
+        self.report.hosts = [host for hosts in self._hosts.values() for host in hosts]
+        for path, hosts in parsed.items():
+            self._rows[path] = self.report.generate_matrix_representation(hosts)
+
+        blocks = [self._rows[path] for path in self._hosts]
+        if blocks:
+            rep = np.concatenate(blocks, axis=0)
+        else:
+            rep = np.empty(shape=(0, len(self.report.get_feature_names())), dtype=self.report.dtype)
+        self.matrix_representation = self.report.update_context_columns(rep)
+        self.report.matrix_representation = self.matrix_representation
@@ -16,31 +16,94 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 from .feature import FeatureBase
-from collections import Counter
-import numpy as np
+from .statistics import FrequencyTable, CountMinSketch
+from ..core.addresses import AddressArray
 
 
-class IpOctetFeature(FeatureBase):
+class AddressFeature(FeatureBase):
+    """Base class of the features computed from host addresses, vectorized over the packed address arrays. The
+    report packs the addresses of the hosts once and shares them between its address features."""
+
+    address_based = True
+
+    def transform(self, hosts, context=None, addresses=None):
+        return self._transform_addresses(addresses if addresses is not None else AddressArray.from_hosts(hosts))
+
+    def _transform(self, hosts):
+        f = lambda x: self._transform_addresses(AddressArray.from_hosts([x]))[0]
+        return f
+
+    def _transform_addresses(self, addresses):
+        """specific transform method, should return the feature column computed from an AddressArray"""
+        raise NotImplementedError
+
+
+class IpOctetFeature(AddressFeature):
 
     def __init__(self, octet):
         self.octet = octet
         super().__init__(name=f"ip_octet_{octet}")
 
-    def _transform(self, hosts):
+    def _transform_addresses(self, addresses):
         """Return the specific IP octet to act as an address range context indicator.
 
           Parameters
           ----------
-          hosts : list
-              The list of all hosts.
+          addresses : AddressArray
+              The packed addresses of all hosts.
 
           Returns
           -------
-          f : lambda function
-              Integer, representation of the octet at the position defined by the class argument.
+          column : numpy ndarray
+              Integer, representation of the octet at the position defined by the class argument, 0 for hosts
+              without an IPv4 address.
         """
-        f = lambda x: int(x.ipv4.exploded.split('.')[self.octet])
-        return f
+        return addresses.ipv4_octet(self.octet)
+
+
+class Ipv6GroupFeature(AddressFeature):
+
+    def __init__(self, group):
+        self.group = group
+        super().__init__(name=f"ipv6_group_{group}")
+
+    def _transform_addresses(self, addresses):
+        """Return the specific 16 bits group of the IPv6 address, the first four groups forming the /64 prefix that
+        acts as an address range context indicator.
+
+          Parameters
+          ----------
+          addresses : AddressArray
+              The packed addresses of all hosts.
+
+          Returns
+          -------
+          column : numpy ndarray
+              Integer, value of the group at the position defined by the class argument, 0 for hosts without an
+              IPv6 address.
+        """
+        return addresses.ipv6_group(self.group)
+
+
+class AddressFamilyFeature(AddressFeature):
+
+    def __init__(self):
+        super().__init__(name="address_family")
+
+    def _transform_addresses(self, addresses):
+        """Returns the address families the host answered on, as dual-stack hosts are exposed on both.
+
+          Parameters
+          ----------
+          addresses : AddressArray
+              The packed addresses of all hosts.
+
+          Returns
+          -------
+          column : numpy ndarray
+              Integer, 1 for IPv4 only, 2 for IPv6 only and 3 for dual-stack hosts.
+        """
+        return addresses.family
 
 
 class TotalPortCountFeature(FeatureBase):
@@ -330,8 +393,13 @@ class CommonWindowsDomainMemberFeature(FeatureBase):
 
 
 class PortEntropyFeature(FeatureBase):
-    def __init__(self):
+    context_dependent = True
+
+    # Port frequencies are counted exactly, or in a CountMinSketch of sketch_width x sketch_depth cells
+    def __init__(self, sketch_width=None, sketch_depth=4):
         super().__init__(name="port_entropy")
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
 
     def _transform(self, hosts):
         """Returns the entropy of port numbers as a measure of regularity of the combination of ports.
@@ -349,12 +417,16 @@ class PortEntropyFeature(FeatureBase):
               Float, the sum of the expected surprise of the port number combination.
         """
 
-        port_list = [port.port for host in hosts for port in host.ports]
-        frequency = Counter(port_list)
-        total = len(port_list)
-        f = lambda x: -sum([(frequency[p.port]/total)*np.log2(frequency[p.port]/total) for p in x.ports])
+        statistics = self._statistics(hosts) if self.statistics is None else self.statistics
+        f = lambda x: sum([statistics.information(p.port) for p in x.ports])
         return f
 
+    def _statistics(self, hosts):
+        ports = (port.port for host in hosts for port in host.ports)
+        if self.sketch_width is not None:
+            return CountMinSketch(ports, width=self.sketch_width, depth=self.sketch_depth)
+        return FrequencyTable(ports)
+
 
 class HostnameLengthFeature(FeatureBase):
         def __init__(self):
@@ -378,6 +450,8 @@ class HostnameLengthFeature(FeatureBase):
 
 
 class HostnameEntropyFeature(FeatureBase):
+    context_dependent = True
+
     def __init__(self):
         super().__init__(name="hostname_entropy")
 
@@ -396,12 +470,9 @@ class HostnameEntropyFeature(FeatureBase):
           f : lambda function
               Float, the expected surprise of characters in the hostname.
         """
-        char_list = []
-        hostname_chars = [list(host.hostname) if host.hostname is not None else '' for host in hosts]
-        for hostname in hostname_chars:
-            char_list.extend(hostname)
-        frequency = Counter(char_list)
-        total = len(char_list)
-
-        f = lambda x: -sum([(frequency[c]/total)*np.log2(frequency[c]/total) for c in x.hostname or ''])
+        statistics = self._statistics(hosts) if self.statistics is None else self.statistics
+        f = lambda x: sum([statistics.information(c) for c in x.hostname or ''])
         return f
+
+    def _statistics(self, hosts):
+        return FrequencyTable(c for host in hosts for c in host.hostname or '')
@@ -21,23 +21,70 @@ import numpy as np
 class FeatureBase:
     """Feature base class"""
 
+    # Features whose value for a host depends on the rest of the report (e.g. corpus frequencies) must set this
+    # so that incremental updates know the whole column has to be recomputed when hosts are added.
+    context_dependent = False
+
+    # Ids of the NSE scripts whose output the feature reads, parsers only keep the outputs of those scripts.
+    script_ids = ()
+
+    # Features computed from the packed addresses of the hosts, which `transform` takes as `addresses` (an
+    # AddressArray) so that the report packs them once for all of its address features.
+    address_based = False
+
     def __init__(self, name=None):
         self.name = name
+        self.statistics = None
 
-    def transform(self, hosts):
-        """Generate a numpy column (type ndarray) to append to the base representation given a _transform function
+    def get_column_names(self):
+        """Names of the columns generated by the feature, a single column named after the feature by default."""
+        return [self.name]
+
+    def fit(self, hosts):
+        """Compute the corpus statistics of the feature from scratch. Statistics are kept by the feature and used by
+        `transform` instead of the transformed hosts, so that new hosts are scored in the context of the fitted ones.
 
           Parameters
           ----------
           hosts : list
               The list of all hosts
 
+          Returns
+          -------
+          self : FeatureBase
+         """
+        self.statistics = None
+        return self.update(hosts)
+
+    def update(self, hosts):
+        """Merge the statistics of `hosts` into the fitted statistics, in time proportional to the new hosts only."""
+        statistics = self._statistics(hosts)
+        if statistics is not None:
+            self.statistics = statistics if self.statistics is None else self.statistics.merge(statistics)
+        return self
+
+    def forget(self, hosts):
+        """Remove from the fitted statistics the contribution of `hosts`, which must have been fitted before."""
+        if self.statistics is not None:
+            self.statistics = self.statistics.subtract(self._statistics(hosts))
+        return self
+
+    def transform(self, hosts, context=None):
+        """Generate a numpy column (type ndarray) to append to the base representation given a _transform function
+
+          Parameters
+          ----------
+          hosts : list
+              The list of hosts to transform
+          context : list, optional
+              The list of all hosts of the report, defaults to `hosts`
+
           Returns
           -------
           column : numpy ndarray
               Feature column indexed by host
          """
-        f = self._transform(hosts)
+        f = self._transform(hosts if context is None else context)
 
         feature = map(f, hosts)
         column = np.array(list(feature), ndmin=2)
@@ -57,3 +104,19 @@ class FeatureBase:
               transformation to apply to every host using a map
         """
         raise NotImplementedError
+
+    def _statistics(self, hosts):
+        """specific statistics method, context dependent features should return the mergeable sufficient statistics
+        (e.g. a FrequencyTable) of the hosts. Context free features have no statistics and return None.
+
+          Parameters
+          ----------
+          hosts : list
+              The list of hosts to summarize
+
+          Returns
+          -------
+          statistics : object or None
+              Statistics supporting `merge` and `subtract`
+        """
+        return None
@@ -0,0 +1,134 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.utils import murmurhash3_32
+from .feature import FeatureBase
+from .statistics import PortProjection
+
+
+def port_tokens(host):
+    """Tokens of the open ports of a host: one per protocol and port number, one per named service."""
+    for port in host.ports:
+        if port.state != 'open':
+            continue
+        yield f"{port.protocol}/{port.port}"
+        if port.service:
+            yield f"service/{port.service}"
+
+
+def port_presence_matrix(hosts, columns, n_columns):
+    """Sparse CSR matrix of the port tokens of every host, whose memory is proportional to the number of open ports.
+
+      Parameters
+      ----------
+      hosts : list
+          The list of hosts to represent
+      columns : function
+          Maps a token to its column and value, or None for tokens that have no column
+      n_columns : int
+          Width of the matrix
+
+      Returns
+      -------
+      presence : scipy.sparse.csr_matrix
+          One row per host, summing the values of its tokens in their columns
+    """
+    indptr, indices, data = [0], [], []
+    for host in hosts:
+        for token in port_tokens(host):
+            column = columns(token)
+            if column is not None:
+                indices.append(column[0])
+                data.append(column[1])
+        indptr.append(len(indices))
+    return sparse.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), indptr),
+                             shape=(len(hosts), n_columns))
+
+
+class PortHashingFeature(FeatureBase):
+    """Open ports and services hashed onto a fixed number of columns, with signed hashing so that collisions cancel
+    out on average. Context free, no statistics to fit."""
+
+    def __init__(self, n_components=32):
+        super().__init__(name="port_hash")
+        self.n_components = n_components
+
+    def get_column_names(self):
+        return [f"{self.name}_{i}" for i in range(self.n_components)]
+
+    def _column(self, token):
+        h = murmurhash3_32(token, seed=0)
+        return abs(h) % self.n_components, 1. if h >= 0 else -1.
+
+    def transform(self, hosts, context=None):
+        """Returns the (hosts x n_components) block of hashed port presence."""
+        return port_presence_matrix(hosts, self._column, self.n_components).toarray()
+
+
+class PortSvdFeature(FeatureBase):
+    """Presence of every open port and service, reduced to a few dense columns by a randomized truncated SVD fitted on
+    the report. Tokens missing from the fitted vocabulary are ignored. The projection is not refitted by incremental
+    updates, which keeps the columns of previous hosts valid."""
+
+    def __init__(self, n_components=32, random_state=0):
+        super().__init__(name="port_svd")
+        self.n_components = n_components
+        self.random_state = random_state
+
+    def get_column_names(self):
+        return [f"{self.name}_{i}" for i in range(self.n_components)]
+
+    def update(self, hosts):
+        if self.statistics is None:
+            self.statistics = self._statistics(hosts)
+        return self
+
+    def forget(self, hosts):
+        return self
+
+    def _statistics(self, hosts):
+        vocabulary = {}
+        for host in hosts:
+            for token in port_tokens(host):
+                vocabulary.setdefault(token, len(vocabulary))
+
+        components = np.zeros((self.n_components, len(vocabulary)))
+        if len(vocabulary) < 2:
+            # Nothing to reduce, a single token is projected on the first column as is
+            components[:len(vocabulary), :len(vocabulary)] = 1.
+            return PortProjection(vocabulary, components)
+
+        # Randomized truncated SVD needs fewer components than tokens
+        n_components = min(self.n_components, len(vocabulary) - 1)
+        if n_components > 0:
+            presence = self._presence(hosts, vocabulary)
+            svd = TruncatedSVD(n_components, algorithm='randomized', random_state=self.random_state).fit(presence)
+            components[:len(svd.components_)] = svd.components_
+        return PortProjection(vocabulary, components)
+
+    def _presence(self, hosts, vocabulary):
+        return port_presence_matrix(hosts, lambda token: (vocabulary[token], 1.) if token in vocabulary else None,
+                                    len(vocabulary))
+
+    def transform(self, hosts, context=None):
+        """Returns the (hosts x n_components) block of projected port presence."""
+        statistics = self._statistics(hosts if context is None else context) if self.statistics is None \
+            else self.statistics
+        return np.asarray(self._presence(hosts, statistics.vocabulary) @ statistics.components.T)
@@ -0,0 +1,132 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+from datetime import datetime, timezone
+from .feature import FeatureBase
+from .statistics import FrequencyTable
+
+
+def script_outputs(host, script_id):
+    """Parsed outputs of an NSE script on every port of the host it ran against."""
+    for port in host.ports:
+        output = port.script(script_id)
+        if output is not None:
+            yield output
+
+
+def certificate_date(text):
+    """Datetime of an ssl-cert validity date, assumed UTC when nmap doesn't give an offset, None if unreadable."""
+    try:
+        date = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    return date if date.tzinfo is not None else date.replace(tzinfo=timezone.utc)
+
+
+def is_self_signed(certificate):
+    """Whether the subject and issuer of an ssl-cert output are the same."""
+    subject = {key[len('subject.'):]: value for key, value in certificate.items() if key.startswith('subject.')}
+    issuer = {key[len('issuer.'):]: value for key, value in certificate.items() if key.startswith('issuer.')}
+    return bool(subject) and subject == issuer
+
+
+class SelfSignedCertificateFeature(FeatureBase):
+    script_ids = ('ssl-cert',)
+
+    def __init__(self):
+        super().__init__(name="ssl_self_signed_count")
+
+    def _transform(self, hosts):
+        """Returns the number of services presenting a self-signed certificate, common on appliances, management
+        interfaces and forgotten test servers.
+
+          Parameters
+          ----------
+          hosts : list
+              The list of all hosts.
+
+          Returns
+          -------
+          f : lambda function
+              Integer sum of all ports whose ssl-cert subject is its issuer.
+        """
+        f = lambda x: sum(1 for certificate in script_outputs(x, 'ssl-cert') if is_self_signed(certificate))
+        return f
+
+
+class ExpiredCertificateFeature(FeatureBase):
+    script_ids = ('ssl-cert',)
+
+    # Certificates are expired relative to `now`, the time of the transform by default
+    def __init__(self, now=None):
+        super().__init__(name="ssl_expired_count")
+        self.now = now
+
+    def _transform(self, hosts):
+        """Returns the number of services presenting an expired certificate, as an indicator of neglected assets.
+
+          Parameters
+          ----------
+          hosts : list
+              The list of all hosts.
+
+          Returns
+          -------
+          f : lambda function
+              Integer sum of all ports whose ssl-cert is no longer valid.
+        """
+        now = self.now or datetime.now(timezone.utc)
+
+        def expired(certificate):
+            date = certificate_date(certificate.get('validity.notAfter'))
+            return date is not None and date < now
+
+        f = lambda x: sum(1 for certificate in script_outputs(x, 'ssl-cert') if expired(certificate))
+        return f
+
+
+class HttpTitleEntropyFeature(FeatureBase):
+    context_dependent = True
+    script_ids = ('http-title',)
+
+    def __init__(self):
+        super().__init__(name="http_title_entropy")
+
+    def _transform(self, hosts):
+        """Returns the character-level entropy of the http page titles of the host. Default pages of common
+        software share their titles across the network, unusual titles stand out.
+
+          Parameters
+          ----------
+          hosts : list
+              The list of all hosts
+
+          Returns
+          -------
+          f : lambda function
+              Float, the expected surprise of characters in the http titles.
+        """
+        statistics = self._statistics(hosts) if self.statistics is None else self.statistics
+        f = lambda x: sum([statistics.information(c) for title in self._titles(x) for c in title])
+        return f
+
+    def _statistics(self, hosts):
+        return FrequencyTable(c for host in hosts for title in self._titles(host) for c in title)
+
+    @staticmethod
+    def _titles(host):
+        for output in script_outputs(host, 'http-title'):
+            yield output.get('title', output['output'])
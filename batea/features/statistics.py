@@ -0,0 +1,156 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from collections import Counter
+import numpy as np
+from sklearn.utils import murmurhash3_32
+
+
+class FrequencyTable:
+    """Mergeable frequency table (counts and total), the sufficient statistic of the entropy features."""
+
+    def __init__(self, items=()):
+        self.counts = Counter(items)
+        self.total = sum(self.counts.values())
+
+    def merge(self, other):
+        """Return a new table holding the counts of both tables."""
+        merged = FrequencyTable()
+        merged.counts = self.counts + other.counts
+        merged.total = self.total + other.total
+        return merged
+
+    def subtract(self, other):
+        """Return a new table without the counts of `other`, which must have been merged in before."""
+        subtracted = FrequencyTable()
+        subtracted.counts = self.counts - other.counts
+        subtracted.total = self.total - other.total
+        return subtracted
+
+    def frequency(self, key):
+        return self.counts[key] / self.total if self.total else 0.
+
+    def information(self, key):
+        """Contribution of `key` to the entropy of the table, zero for keys that were never seen."""
+        p = self.frequency(key)
+        return -p * np.log2(p) if p > 0 else 0.
+
+    def __eq__(self, other):
+        return isinstance(other, FrequencyTable) and self.counts == other.counts and self.total == other.total
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class CountMinSketch:
+    """Fixed-size, mergeable approximation of a frequency table, for keys too numerous to count exactly.
+
+    Every key is counted in one cell per row of a (depth x width) table, picked by a seeded hash, and its count is
+    estimated by the smallest of its cells. Estimates never undercount, and overcount by at most e * total / width
+    with probability 1 - exp(-depth). Hashes are seeded by row only, so sketches of the same shape built from
+    different chunks or shards add up to the sketch of all of their keys.
+    """
+
+    def __init__(self, items=(), width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self._estimates = {}
+        keys = np.fromiter((self._key(item) for item in items), dtype=np.int32)
+        for row in range(depth):
+            np.add.at(self.table[row], self._cells(keys, row), 1)
+        self.total = len(keys)
+
+    @staticmethod
+    def _key(item):
+        if isinstance(item, (int, np.integer)) and -2 ** 31 <= item < 2 ** 31:
+            return item
+        return murmurhash3_32(str(item), seed=0)
+
+    def _cells(self, keys, row):
+        return murmurhash3_32(keys, seed=row + 1, positive=True) % self.width
+
+    def _combine(self, other, table):
+        assert (self.width, self.depth) == (other.width, other.depth), \
+            f"Sketches of different shapes can't be combined: " \
+            f"{(self.width, self.depth)} != {(other.width, other.depth)}"
+        combined = CountMinSketch(width=self.width, depth=self.depth)
+        combined.table = table
+        return combined
+
+    def merge(self, other):
+        """Return a new sketch holding the counts of both sketches."""
+        merged = self._combine(other, self.table + other.table)
+        merged.total = self.total + other.total
+        return merged
+
+    def subtract(self, other):
+        """Return a new sketch without the counts of `other`, which must have been merged in before."""
+        subtracted = self._combine(other, self.table - other.table)
+        subtracted.total = self.total - other.total
+        return subtracted
+
+    def count(self, key):
+        key = np.array([self._key(key)], dtype=np.int32)
+        return min(self.table[row, self._cells(key, row)[0]] for row in range(self.depth))
+
+    def frequency(self, key):
+        return self.count(key) / self.total if self.total else 0.
+
+    def information(self, key):
+        """Contribution of `key` to the entropy of the sketch, zero for keys that were never seen."""
+        if key not in self._estimates:
+            p = self.frequency(key)
+            self._estimates[key] = -p * np.log2(p) if p > 0 else 0.
+        return self._estimates[key]
+
+    def __eq__(self, other):
+        return (isinstance(other, CountMinSketch) and self.total == other.total
+                and np.array_equal(self.table, other.table))
+
+    def __len__(self):
+        return self.width
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_estimates'] = {}
+        return state
+
+
+class PortProjection:
+    """Vocabulary of port tokens and the truncated SVD components projecting their presence onto a few dense columns.
+
+    The projection is fitted once and then frozen, merging or subtracting hosts leaves it unchanged.
+    """
+
+    def __init__(self, vocabulary, components):
+        self.vocabulary = vocabulary
+        self.components = components
+
+    def merge(self, other):
+        return self
+
+    def subtract(self, other):
+        return self
+
+    def __eq__(self, other):
+        return (isinstance(other, PortProjection) and self.vocabulary == other.vocabulary
+                and np.array_equal(self.components, other.components))
+
+    def __len__(self):
+        return len(self.vocabulary)
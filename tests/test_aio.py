@@ -0,0 +1,98 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea import NmapReport
+from batea.core import BateaModel
+from batea.core.aio import parse_async, matrix_async, score_async, model_process_pool
+from batea.features.basic_features import TotalPortCountFeature, IpOctetFeature
+from sklearn.ensemble import IsolationForest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from os.path import dirname, join
+import asyncio
+import numpy as np
+import pytest
+
+xml_filename = join(dirname(__file__), 'samples/single_full.xml')
+
+
+def test_parse_async_with_thread_and_process_executors():
+    async def parse():
+        with open(xml_filename, 'rb') as file:
+            from_file = await parse_async(file, batch_size=2)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            from_path = await parse_async(xml_filename, executor=executor)
+        return from_file, from_path
+
+    from_file, from_path = asyncio.run(parse())
+
+    assert len(from_file) == len(from_path) > 0
+    assert [host.ipv4 for host in from_file] == [host.ipv4 for host in from_path]
+
+
+def test_concurrent_score_requests_share_one_model():
+    matrix = np.random.RandomState(0).normal(size=(1000, 3))
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0))
+    batea.fit(matrix)
+
+    async def score():
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            return await asyncio.gather(*[score_async(batea, matrix[i::4], executor=executor, block_size=50)
+                                          for i in range(4)])
+
+    scores = asyncio.run(score())
+
+    for i in range(4):
+        assert np.allclose(scores[i], batea.score(matrix[i::4]))
+
+
+def test_score_async_in_model_process_pool():
+    matrix = np.random.RandomState(0).normal(size=(200, 3))
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0))
+    batea.fit(matrix)
+
+    async def score():
+        with model_process_pool(batea, max_workers=2) as executor:
+            return await score_async(batea, matrix, executor=executor, block_size=64)
+
+    assert np.allclose(asyncio.run(score()), batea.score(matrix))
+
+
+def test_score_async_can_be_cancelled():
+    matrix = np.random.RandomState(0).normal(size=(2000, 3))
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0))
+    batea.fit(matrix)
+
+    async def cancel():
+        task = asyncio.ensure_future(score_async(batea, matrix, block_size=1))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancel())
+
+
+def test_matrix_async_builds_report_matrix():
+    report = NmapReport()
+    report.add_feature(IpOctetFeature(3))
+    report.add_feature(TotalPortCountFeature())
+
+    async def build():
+        report.hosts = await parse_async(xml_filename)
+        return await matrix_async(report)
+
+    assert np.array_equal(asyncio.run(build()), report.generate_matrix_representation())
@@ -0,0 +1,106 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea import Baseline, Host, Port, build_report
+from batea.core import BateaModel
+from batea.core.baseline import rank_scores
+from sklearn.ensemble import IsolationForest
+from ipaddress import ip_address
+import numpy as np
+import io
+import pytest
+
+
+def make_hosts():
+    return [Host(ip_address(f'10.0.0.{i}'), hostname=f'host{i}.delvesecurity.com',
+                 ports=[Port(port=22, protocol='tcp', state='open', service='ssh'),
+                        Port(port=80 + i, protocol='tcp', state='open', service='http')]) for i in range(20)]
+
+
+def fitted_model(report):
+    report.fit_features()
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0),
+                       report_features=report.get_feature_names(), statistics=report.get_statistics())
+    batea.model.fit(report.generate_matrix_representation())
+    return batea
+
+
+def test_host_fingerprint_ignores_port_order():
+    ports = [Port(port=22, service='ssh'), Port(port=80, service='http')]
+    host = Host(ip_address('10.0.0.1'), ports=ports)
+
+    assert host.fingerprint() == Host(ip_address('10.0.0.1'), ports=ports[::-1]).fingerprint()
+    assert host.fingerprint() != Host(ip_address('10.0.0.1'), ports=ports[:1]).fingerprint()
+
+
+def test_rank_scores():
+    assert list(rank_scores(np.array([0.2, 0.9, 0.5]))) == [3, 1, 2]
+
+
+def test_rescore_only_changed_hosts_and_matches_full_scoring():
+    report = build_report()
+    report.hosts = make_hosts()
+    batea = fitted_model(report)
+    matrix = report.generate_matrix_representation()
+    previous = Baseline.from_report(report, matrix, -batea.model.score_samples(matrix), model_digest=batea.digest())
+
+    dump = io.BytesIO()
+    previous.save(dump)
+    dump.seek(0)
+    previous = Baseline.load(dump)
+
+    hosts = make_hosts()
+    hosts[3].add_port(Port(port=3306, protocol='tcp', state='open', service='mysql'))
+    hosts[5] = Host(ip_address('10.0.1.1'))
+    del hosts[7]
+    new_report = build_report()
+    new_report.hosts = hosts
+    new_report.set_statistics(batea.statistics)
+
+    current, changes = previous.rescore(new_report, batea)
+
+    expected = new_report.generate_matrix_representation()
+    assert np.allclose(current.matrix, expected)
+    assert np.allclose(current.scores, -batea.model.score_samples(expected))
+    assert {(change['host'], change['status']) for change in changes} == {
+        ('10.0.0.3', 'changed'), ('10.0.1.1', 'new'), ('10.0.0.5', 'removed'), ('10.0.0.7', 'removed')}
+
+
+def test_rescore_refuses_baselines_of_other_models():
+    report = build_report()
+    report.hosts = make_hosts()
+    batea = fitted_model(report)
+    matrix = report.generate_matrix_representation()
+    dump = io.BytesIO()
+    batea.dump_model(dump)
+    dump.seek(0)
+    loaded = BateaModel(report_features=report.get_feature_names())
+    loaded.load_model(dump)
+    other = fitted_model(report)
+    other.model.set_params(random_state=1).fit(matrix)
+
+    baseline = io.BytesIO()
+    Baseline.from_report(report, matrix, batea.score(matrix), model_digest=batea.digest()).save(baseline)
+    baseline.seek(0)
+    previous = Baseline.load(baseline)
+
+    assert previous.model_digest == loaded.digest()
+    previous.rescore(report, loaded)
+    with pytest.raises(AssertionError):
+        previous.rescore(report, other)
+    with pytest.raises(AssertionError):
+        Baseline.from_report(report, matrix, batea.score(matrix)).rescore(report, batea)
@@ -22,7 +22,16 @@ from batea.features.basic_features import LowPortCountFeature, NamedServiceCount
 from batea.features.basic_features import MaxBannerLengthFeature, WindowsOSFeature, LinuxOSFeature
 from batea.features.basic_features import HttpServerCountFeature, DatabaseCountFeature, CommonWindowsDomainAdminFeature
 from batea.features.basic_features import CommonWindowsDomainMemberFeature, PortEntropyFeature, HostnameLengthFeature
-from batea.features.basic_features import HostnameEntropyFeature
+from batea.features.basic_features import HostnameEntropyFeature, Ipv6GroupFeature, AddressFamilyFeature
+from batea.features.port_features import PortHashingFeature, PortSvdFeature
+from batea.features.script_features import SelfSignedCertificateFeature, ExpiredCertificateFeature
+from batea.features.script_features import HttpTitleEntropyFeature
+from batea.features.statistics import FrequencyTable, CountMinSketch
+from batea.core.addresses import AddressArray
+from batea.core.nmap_parser import NmapReportParser
+from datetime import datetime, timezone
+from os.path import join, dirname
+import numpy as np
 
 
 def test_total_port_count():
@@ -271,3 +280,174 @@ def test_hostname_entropy():
     assert array[0, 0] <= array[1, 0]
     assert array[1, 0] == array[2, 0]
     assert array[3, 0] == 0
+
+
+def test_fitted_port_entropy_uses_training_context():
+    training = [Host(ip_address('192.168.1.1'), ports=[Port(port=53), Port(port=88)]),
+                Host(ip_address('192.168.1.2'), ports=[Port(port=53), Port(port=135)])]
+    feature = PortEntropyFeature().fit(training)
+
+    column = feature.transform([Host(ip_address('192.168.1.3'), ports=[Port(port=53), Port(port=8443)])])
+
+    assert column[0, 0] == -0.5 * np.log2(0.5)
+
+
+def test_feature_statistics_update_matches_fit():
+    first = [Host(ip_address('192.168.1.1'), hostname='a.delvesecurity.com', ports=[Port(port=53)])]
+    second = [Host(ip_address('192.168.1.2'), hostname='b.delvesecurity.com', ports=[Port(port=53), Port(port=80)])]
+
+    for feature_class in [PortEntropyFeature, HostnameEntropyFeature]:
+        updated = feature_class().fit(first).update(second)
+        fitted = feature_class().fit(first + second)
+
+        assert updated.statistics == fitted.statistics
+        assert updated.forget(second).statistics == feature_class().fit(first).statistics
+
+
+def test_report_merge_combines_statistics():
+    report = NmapReport()
+    report.add_feature(PortEntropyFeature())
+    report.hosts = [Host(ip_address('192.168.1.1'), ports=[Port(port=53), Port(port=88)])]
+    report.fit_features()
+
+    other = NmapReport()
+    other.add_feature(PortEntropyFeature())
+    other.hosts = [Host(ip_address('192.168.1.2'), ports=[Port(port=53), Port(port=135)])]
+    other.fit_features()
+
+    report.merge(other)
+    expected = PortEntropyFeature().fit(report.hosts)
+
+    assert len(report.hosts) == 2
+    assert report.get_statistics()['port_entropy'] == expected.statistics
+
+
+def test_address_features_handle_dual_stack_and_ipv6_only_hosts():
+    report = NmapReport()
+    report.hosts = [Host(ip_address('192.168.1.1')),
+                    Host(ipv6=ip_address('2001:db8:85a3::8a2e:370:7334')),
+                    Host(ip_address('10.0.0.1'), ipv6=ip_address('fe80::1'))]
+
+    report.add_feature(IpOctetFeature(0))
+    report.add_feature(IpOctetFeature(3))
+    report.add_feature(Ipv6GroupFeature(0))
+    report.add_feature(Ipv6GroupFeature(2))
+    report.add_feature(Ipv6GroupFeature(7))
+    report.add_feature(AddressFamilyFeature())
+
+    array = report.generate_matrix_representation()
+
+    assert list(array[0, :]) == [192, 1, 0, 0, 0, 1]
+    assert list(array[1, :]) == [0, 0, 0x2001, 0x85a3, 0x7334, 2]
+    assert list(array[2, :]) == [10, 1, 0xfe80, 0, 1, 3]
+
+
+def test_address_features_share_addresses_packed_once(monkeypatch):
+    packed = []
+    from_hosts = AddressArray.from_hosts.__func__
+    monkeypatch.setattr(AddressArray, 'from_hosts',
+                        classmethod(lambda cls, hosts: packed.append(from_hosts(cls, hosts)) or packed[-1]))
+    report = NmapReport()
+    report.hosts = [Host(ip_address('192.168.1.1')), Host(ip_address('10.0.0.1'))]
+    for octet in range(4):
+        report.add_feature(IpOctetFeature(octet))
+
+    assert report.generate_matrix_representation().tolist() == [[192, 168, 1, 1], [10, 0, 0, 1]]
+    assert len(packed) == 1
+    assert '_ipv6' not in packed[0].__dict__ and 'family' not in packed[0].__dict__
+
+
+def port_block_hosts():
+    return [Host(ip_address('10.0.0.1'), ports=[Port(port=22, protocol='tcp', state='open', service='ssh')]),
+            Host(ip_address('10.0.0.2'), ports=[Port(port=22, protocol='tcp', state='open', service='ssh'),
+                                                Port(port=3389, protocol='tcp', state='open'),
+                                                Port(port=445, protocol='tcp', state='closed')]),
+            Host(ip_address('10.0.0.3'))]
+
+
+def test_port_hashing_block_appended_to_matrix():
+    report = NmapReport()
+    report.add_feature(TotalPortCountFeature())
+    report.add_feature(PortHashingFeature(n_components=8))
+    report.hosts = port_block_hosts()
+
+    matrix = report.generate_matrix_representation()
+
+    assert report.get_feature_names() == ['port_count'] + [f'port_hash_{i}' for i in range(8)]
+    assert matrix.shape == (3, 9)
+    assert matrix[:, 0].tolist() == [1, 3, 0]
+    assert np.abs(matrix[0, 1:]).sum() == 2
+    assert np.abs(matrix[2, 1:]).sum() == 0
+
+
+def test_port_svd_block_keeps_fitted_projection():
+    report = NmapReport()
+    report.add_feature(PortSvdFeature(n_components=4))
+    report.hosts = port_block_hosts()
+    report.fit_features()
+
+    projection = report.get_statistics()['port_svd']
+    matrix = report.generate_matrix_representation()
+    report.update_features([Host(ip_address('10.0.0.4'), ports=[Port(port=80, protocol='tcp', state='open')])])
+
+    assert sorted(projection.vocabulary) == ['service/ssh', 'tcp/22', 'tcp/3389']
+    assert matrix.shape == (3, 4)
+    assert np.all(matrix[:, 3] == 0)
+    assert report.get_statistics()['port_svd'] is projection
+    assert np.allclose(report.generate_matrix_representation(), matrix)
+
+
+def test_port_svd_block_of_small_vocabularies():
+    report = NmapReport()
+    report.add_feature(PortSvdFeature(n_components=4))
+    report.hosts = [Host(ip_address(f'10.0.0.{i}'), ports=[Port(port=80, protocol='tcp', state='open')])
+                    for i in range(2)]
+    report.fit_features()
+
+    assert report.generate_matrix_representation().tolist() == [[1., 0., 0., 0.], [1., 0., 0., 0.]]
+
+    report.hosts = port_block_hosts()
+    report.fit_features()
+    matrix = report.generate_matrix_representation()
+
+    assert len(report.get_statistics()['port_svd'].vocabulary) <= 4
+    assert np.all(matrix[:, 2:] == 0) and np.any(matrix[:, :2] != 0)
+
+
+def test_count_min_sketch_bounds_frequency_error():
+    ports = [int(port) for port in np.random.RandomState(0).zipf(1.5, size=20000) % 65536]
+    sketch = CountMinSketch(ports, width=1024, depth=4)
+    table = FrequencyTable(ports)
+
+    for port in list(table.counts)[:500]:
+        assert table.counts[port] <= sketch.count(port) <= table.counts[port] + np.e * len(ports) / 1024
+
+
+def test_count_min_sketches_merge_like_their_hosts():
+    hosts = [Host(ip_address('10.0.0.1'), ports=[Port(port=22), Port(port=80)]),
+             Host(ip_address('10.0.0.2'), ports=[Port(port=22), Port(port=443)]),
+             Host(ip_address('10.0.0.3'), ports=[Port(port=3389)])]
+    feature = PortEntropyFeature(sketch_width=256)
+
+    merged = feature.fit(hosts[:2]).update(hosts[2:]).statistics
+
+    assert merged == PortEntropyFeature(sketch_width=256).fit(hosts).statistics
+    assert merged.subtract(feature._statistics(hosts[2:])) == feature._statistics(hosts[:2])
+    assert np.allclose(feature.transform(hosts), PortEntropyFeature().fit(hosts).transform(hosts))
+
+
+def test_script_features():
+    report = NmapReport()
+    report.add_feature(SelfSignedCertificateFeature())
+    report.add_feature(ExpiredCertificateFeature(now=datetime(2020, 1, 1, tzinfo=timezone.utc)))
+    report.add_feature(HttpTitleEntropyFeature())
+    parser = NmapReportParser(script_ids=report.get_script_ids())
+    with open(join(dirname(__file__), "samples/scripts.xml"), 'rb') as f:
+        report.hosts = list(parser.load_hosts(f))
+
+    matrix = report.generate_matrix_representation()
+
+    assert report.get_script_ids() == {'ssl-cert', 'http-title'}
+    assert matrix[:, 0].tolist() == [1, 0]
+    assert matrix[:, 1].tolist() == [1, 0]
+    assert matrix[0, 2] > 0 and matrix[1, 2] > 0
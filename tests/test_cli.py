@@ -0,0 +1,118 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+from batea import NmapReportParser, build_report
+from batea.__main__ import main
+from batea.core import BateaModel, ShardResult
+from click.testing import CliRunner
+from sklearn.ensemble import IsolationForest
+from os.path import join, dirname
+import io
+import json
+import pytest
+
+nmap_full_filename = join(dirname(__file__), "samples/single_full.xml")
+
+
+def pretrained_model(path, filename, **report_options):
+    """Dump a small model trained on the hosts of `filename`, for the commands scoring with -L."""
+    report = build_report(**report_options)
+    with open(filename, 'rb') as f:
+        report.hosts = list(NmapReportParser(script_ids=report.get_script_ids()).load_hosts(f))
+    report.fit_features()
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0),
+                       report_features=report.get_feature_names())
+    batea.statistics = report.get_statistics()
+    batea.fit(report.generate_matrix_representation())
+    with open(path, 'wb') as f:
+        batea.dump_model(f)
+    return str(path)
+
+
+def rank(*args):
+    result = CliRunner().invoke(main, list(args))
+    assert result.exit_code == 0, result.output
+    return json.loads(result.stdout)
+
+
+def test_rank_outputs_float32_features(tmp_path):
+    model = pretrained_model(tmp_path / "model.batea", nmap_full_filename)
+
+    output = rank('-v', '--dtype', 'float32', '-L', model, nmap_full_filename)
+
+    assert len(output['host_info']) == 2
+    assert all(isinstance(value, float) for value in output['host_info'][0]['features'].values())
+
+
+def test_rank_outputs_script_outputs_of_ports(tmp_path):
+    scripts_filename = join(dirname(__file__), "samples/scripts.xml")
+    model = pretrained_model(tmp_path / "model.batea", scripts_filename, script_features=True)
+
+    output = rank('-vv', '--script-features', '-L', model, scripts_filename)
+
+    ports = {info['host']: info['ports'] for info in output['host_info']}
+    assert ports['10.0.0.1'][0]['scripts'] == {'http-title': {'output': 'Appliance Login', 'title': 'Appliance Login'}}
+    assert ports['10.0.0.2'][0]['scripts']['ssl-cert']['issuer.commonName'] == 'Example CA'
+
+
+def test_rank_rejects_pruning_pretrained_models(tmp_path, monkeypatch):
+    model = pretrained_model(tmp_path / "model.batea", nmap_full_filename)
+    stderr = io.StringIO()
+    monkeypatch.setattr('batea.core.output_manager.stderr', stderr)
+
+    result = CliRunner().invoke(main, ['--prune-features', '-L', model, nmap_full_filename])
+
+    assert result.stdout == ''
+    assert "Pruning selects the columns of a new model" in stderr.getvalue()
+
+
+def test_rank_with_several_models_outputs_their_mean_score(tmp_path, monkeypatch):
+    first = pretrained_model(tmp_path / "first.batea", nmap_full_filename)
+    second = pretrained_model(tmp_path / "second.batea", join(dirname(__file__), "samples/single_base.xml"))
+
+    output = rank('-v', '-L', first, '-L', second, nmap_full_filename)
+
+    for info in output['host_info']:
+        assert info['score'] == pytest.approx(sum(model['score'] for model in info['models']) / 2)
+
+    stderr = io.StringIO()
+    monkeypatch.setattr('batea.core.output_manager.stderr', stderr)
+    result = CliRunner().invoke(main, ['-L', first, '-L', second, '-oM', str(tmp_path / 'matrix.csv'),
+                                       nmap_full_filename])
+    assert result.stdout == ''
+    assert "Several models (-L)" in stderr.getvalue()
+
+
+def test_score_shard_with_script_features(tmp_path):
+    scripts_filename = join(dirname(__file__), "samples/scripts.xml")
+    model = pretrained_model(tmp_path / "model.batea", scripts_filename, script_features=True)
+    shard = str(tmp_path / "shard.npz")
+
+    result = CliRunner().invoke(main, ['score-shard', '--script-features', '-L', model, '-o', shard, scripts_filename])
+
+    assert result.exit_code == 0, result.output
+    assert 'ssl_self_signed_count' in ShardResult.load(shard).features
+
+
+def test_rank_rejects_growing_pretrained_models(tmp_path, monkeypatch):
+    model = pretrained_model(tmp_path / "model.batea", nmap_full_filename)
+    stderr = io.StringIO()
+    monkeypatch.setattr('batea.core.output_manager.stderr', stderr)
+
+    result = CliRunner().invoke(main, ['--adaptive', '-L', model, nmap_full_filename])
+
+    assert result.stdout == ''
+    assert "Adaptive training grows the forest of a new model" in stderr.getvalue()
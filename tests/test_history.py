@@ -0,0 +1,62 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea.core.history import ScoreHistory
+import numpy as np
+
+
+def record_runs(history):
+    features = ['port_count', 'port_entropy']
+    history.record(['10.0.0.1', '10.0.0.2', '10.0.0.3'], np.array([.9, .5, .1]),
+                   np.array([[1., 2.], [3., 4.], [5., 6.]]), features, inputs=['week1.xml'])
+    return history.record(['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'], np.array([.4, .5, .8, .9]),
+                          np.array([[1., 2.], [3., 4.], [5., 7.], [0., 0.]]), features, inputs=['week2.xml'])
+
+
+def test_top_movers_since_previous_run(tmp_path):
+    history = ScoreHistory(str(tmp_path / 'history.db'))
+    run_id = record_runs(history)
+
+    movers = history.top_movers(n=2)
+
+    assert run_id == history.last_run() == 2
+    assert [(mover['host'], mover['previous_rank'], mover['rank']) for mover in movers] == \
+        [('10.0.0.3', 3, 2), ('10.0.0.2', 2, 3)]
+
+
+def test_host_history_across_runs(tmp_path):
+    history = ScoreHistory(str(tmp_path / 'history.db'))
+    record_runs(history)
+
+    runs = history.host_history('10.0.0.3')
+
+    assert [run['run'] for run in runs] == [1, 2]
+    assert [run['rank'] for run in runs] == [3, 2]
+    assert runs[1]['features'] == {'port_count': 5., 'port_entropy': 7.}
+    assert history.host_history('10.0.0.9') == []
+
+
+def test_history_queries_use_indexes(tmp_path):
+    history = ScoreHistory(str(tmp_path / 'history.db'))
+    plans = [history.connection.execute(f"EXPLAIN QUERY PLAN {query}", parameters).fetchall()
+             for query, parameters in [
+                 ("SELECT * FROM scores WHERE run_id = ? AND movement IS NOT NULL ORDER BY movement DESC LIMIT 5",
+                  (1,)),
+                 ("SELECT * FROM scores WHERE address = ? ORDER BY run_id", ('10.0.0.1',))]]
+
+    assert 'scores_movement' in str(plans[0])
+    assert 'scores_address' in str(plans[1])
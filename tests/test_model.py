@@ -0,0 +1,271 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea import NmapReport, Host, Port
+from batea.core import BateaModel, DeduplicatedMatrix, BackingStore
+from batea.core.storage import open_array
+from batea.core.budget import plan_model
+from batea.core.forest import path_lengths, anomaly_scores, path_contributions, average_path_length
+from batea.core.ensemble import ModelEnsemble, EnsembleScores
+from batea.core.pruning import analyze_columns
+from batea.features.basic_features import PortEntropyFeature
+from batea.features.port_features import PortSvdFeature
+from sklearn.ensemble import IsolationForest
+from ipaddress import ip_address
+import io
+import pickle
+import numpy as np
+
+
+def test_dump_and_load_model_keeps_feature_statistics():
+    report = NmapReport()
+    report.add_feature(PortEntropyFeature())
+    report.hosts = [Host(ip_address('192.168.1.1'), ports=[Port(port=53), Port(port=88)])]
+    report.fit_features()
+
+    batea = BateaModel(model=IsolationForest(n_estimators=5), report_features=report.get_feature_names(),
+                       statistics=report.get_statistics())
+    batea.model.fit(report.generate_matrix_representation())
+    dump = io.BytesIO()
+    batea.dump_model(dump)
+    dump.seek(0)
+
+    loaded = BateaModel(report_features=['port_entropy'])
+    loaded.load_model(dump)
+
+    assert loaded.statistics == report.get_statistics()
+
+
+def test_load_model_without_statistics():
+    dump = io.BytesIO()
+    pickle.dump((IsolationForest(), ['port_entropy']), dump)
+    dump.seek(0)
+
+    loaded = BateaModel(report_features=['port_entropy'])
+    loaded.load_model(dump)
+
+    assert loaded.statistics == {}
+
+
+def test_deduplicated_matrix_broadcasts_scores_back_to_rows():
+    matrix = np.array([[1., 2.], [3., 4.], [1., 2.], [1., 2.]])
+    unique_rep = DeduplicatedMatrix(matrix)
+
+    assert len(unique_rep) == 2
+    assert sorted(unique_rep.counts) == [1, 3]
+    assert np.array_equal(unique_rep.unique[unique_rep.inverse], matrix)
+
+
+def test_weighted_fit_matches_scores_of_full_matrix():
+    rng = np.random.RandomState(0)
+    matrix = np.repeat(rng.randint(0, 5, size=(20, 3)).astype(float), rng.randint(1, 50, size=20), axis=0)
+    unique_rep = DeduplicatedMatrix(matrix)
+
+    batea = BateaModel(model=IsolationForest(n_estimators=50, random_state=0))
+    batea.fit(unique_rep.unique, sample_weight=unique_rep.counts)
+    scores = unique_rep.broadcast(batea.score(unique_rep.unique))
+
+    full = BateaModel(model=IsolationForest(n_estimators=50, random_state=0)).fit(matrix)
+
+    assert scores.shape == (len(matrix),)
+    assert np.corrcoef(scores, full.score(matrix))[0, 1] > 0.9
+
+
+def test_score_by_blocks_into_memory_mapped_scores(tmp_path):
+    rng = np.random.RandomState(0)
+    store = BackingStore(str(tmp_path))
+    matrix = store.allocate_matrix((100, 3), np.float32)
+    matrix[:] = rng.rand(100, 3)
+
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0)).fit(matrix)
+    scores = batea.score(open_array(store.matrix_path), out=store.allocate_scores(100), block_size=7)
+
+    assert isinstance(scores, np.memmap)
+    assert np.allclose(scores, -batea.model.score_samples(np.asarray(matrix)))
+
+
+def test_report_matrix_is_written_to_backing_store(tmp_path):
+    report = NmapReport(store=BackingStore(str(tmp_path)))
+    report.add_feature(PortEntropyFeature())
+    report.hosts = [Host(ip_address('192.168.1.1'), ports=[Port(port=53), Port(port=88)]),
+                    Host(ip_address('192.168.1.2'), ports=[Port(port=53)])]
+
+    matrix = report.generate_matrix_representation()
+    matrix.flush()
+
+    assert isinstance(matrix, np.memmap)
+    assert np.array_equal(open_array(report.store.matrix_path), report.generate_matrix_representation(report.hosts))
+
+
+def test_plan_model_fits_trees_within_budget():
+    settings, estimate = plan_model(n_samples=100000, budget=10., fit_cost=0.01, score_cost=1e-6, n_jobs=4)
+
+    assert settings['n_jobs'] == 4
+    assert settings['max_samples'] == 256
+    assert settings['n_estimators'] == 78
+    assert estimate <= 10. * 0.8
+
+
+def test_plan_model_shrinks_subsamples_on_tight_budgets():
+    settings, _ = plan_model(n_samples=100000, budget=1., fit_cost=0.01, score_cost=1e-6, n_jobs=1)
+
+    assert settings['max_samples'] == 64
+    assert settings['n_estimators'] == 10
+
+
+def test_plan_model_keeps_requested_upper_bound():
+    settings, _ = plan_model(n_samples=1000, budget=60., fit_cost=0.01, score_cost=1e-6, n_estimators=50, n_jobs=1)
+
+    assert settings['n_estimators'] == 50
+
+
+def test_path_lengths_match_isolation_forest_scores():
+    matrix = np.random.RandomState(0).normal(size=(300, 3))
+    model = IsolationForest(n_estimators=10, max_samples=64, random_state=0).fit(matrix)
+
+    assert np.allclose(anomaly_scores(model, path_lengths(model, matrix)), -model.score_samples(matrix))
+
+
+def test_fit_adaptive_stops_once_top_ranking_is_stable():
+    matrix = np.random.RandomState(0).normal(size=(1000, 3))
+    matrix[:3] += 10
+    batea = BateaModel(model=IsolationForest(random_state=0))
+
+    scores = batea.fit_adaptive(matrix, n_top=3, batch_size=10, max_estimators=500)
+
+    assert len(batea.model.estimators_) < 500
+    assert sorted(np.argsort(scores)[::-1][:3]) == [0, 1, 2]
+    assert np.allclose(scores, batea.score(matrix))
+
+
+def test_path_contributions_decompose_path_length_savings():
+    matrix = np.random.RandomState(0).normal(size=(500, 4))
+    matrix[0, 2] = 9.
+    model = IsolationForest(n_estimators=20, max_samples=100, random_state=0).fit(matrix)
+
+    contributions = path_contributions(model, matrix[:5])
+
+    savings = average_path_length([model.max_samples_])[0] - path_lengths(model, matrix[:5]) / 20
+    assert np.allclose(contributions.sum(axis=1), savings)
+    assert np.argmax(contributions[0]) == 2
+
+
+def entropy_report(hosts):
+    report = NmapReport()
+    report.add_feature(PortEntropyFeature())
+    report.add_feature(PortSvdFeature(n_components=2))
+    report.hosts = hosts
+    report.fit_features()
+    return report
+
+
+def test_model_ensemble_scores_each_model_with_its_statistics():
+    hosts = [Host(ip_address(f'10.0.0.{i}'), ports=[Port(port=22 + i % (3 + i // 10), protocol='tcp', state='open'),
+                                                    Port(port=80, protocol='tcp', state='open')]) for i in range(30)]
+    models = []
+    for training in (hosts[:10], hosts[10:]):
+        report = entropy_report(training)
+        model = BateaModel(model=IsolationForest(n_estimators=5, random_state=0),
+                           report_features=report.get_feature_names(), statistics=report.get_statistics())
+        model.fit(report.generate_matrix_representation())
+        models.append(model)
+
+    report = entropy_report(hosts)
+    matrix, scores = ModelEnsemble(models, ['a', 'b']).score(report)
+
+    for model, model_scores in zip(models, scores.scores):
+        report.set_statistics(model.statistics)
+        assert np.allclose(model_scores, model.score(report.generate_matrix_representation()))
+    assert scores.host_info(0)[1]['model'] == 'b'
+
+
+def test_ensemble_aggregates_ranks():
+    scores = EnsembleScores(['a', 'b'], [[.9, .5, .1], [.1, .5, .9]])
+
+    values, key = scores.aggregate('mean-rank')
+    assert values.tolist() == [2., 2., 2.]
+    values, key = scores.aggregate('min-rank')
+    assert values.tolist() == [1, 2, 1]
+    assert key.tolist() == [-1, -2, -1]
+    values, key = scores.aggregate('mean-score')
+    assert np.allclose(values, [.5, .5, .5])
+
+
+def pruning_matrix():
+    random_state = np.random.RandomState(0)
+    octet = random_state.normal(size=1000) * 3 + 200
+    flag = np.zeros(1000)
+    flag[0] = 1
+    noise = random_state.normal(size=1000)
+    return np.column_stack([np.full(1000, 192.), octet, flag, noise, 2 * octet + 5, -noise])
+
+
+def test_analyze_columns_finds_constant_and_correlated_columns():
+    columns, dropped = analyze_columns(pruning_matrix())
+
+    assert columns.tolist() == [1, 2, 3]
+    assert dropped == {0: 'constant', 4: 'correlated:1', 5: 'correlated:3'}
+
+    columns, dropped = analyze_columns(pruning_matrix(), near_constant=0.99)
+    assert columns.tolist() == [1, 3]
+    assert dropped[2] == 'near-constant'
+
+
+def test_analyze_columns_keeps_a_column_of_constant_matrices():
+    columns, dropped = analyze_columns(np.ones((10, 3)))
+
+    assert columns.tolist() == [0]
+    assert dropped == {1: 'constant', 2: 'constant'}
+
+
+def test_pruned_columns_are_dumped_with_the_model():
+    matrix = pruning_matrix()
+    features = ['ip_octet_0', 'ip_octet_1', 'flag', 'noise', 'double', 'negated']
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0), report_features=features)
+
+    pruned = batea.prune(matrix)
+    batea.fit(matrix)
+    dump = io.BytesIO()
+    batea.dump_model(dump)
+    dump.seek(0)
+    loaded = BateaModel(report_features=features)
+    loaded.load_model(dump)
+
+    assert pruned == {'ip_octet_0': 'constant', 'double': 'correlated with ip_octet_1',
+                      'negated': 'correlated with noise'}
+    assert loaded.columns.tolist() == [1, 2, 3]
+    assert np.allclose(loaded.score(matrix), batea.score(matrix))
+    assert np.all(loaded.explain(matrix[:2])[:, [0, 4, 5]] == 0)
+
+
+def test_calibrated_percentiles_survive_a_dump():
+    matrix = np.random.RandomState(0).normal(size=(500, 3))
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0), report_features=['a', 'b', 'c'])
+    batea.fit(matrix)
+    scores = batea.score(matrix)
+    batea.calibrate(scores)
+    dump = io.BytesIO()
+    batea.dump_model(dump)
+    dump.seek(0)
+    loaded = BateaModel(report_features=['a', 'b', 'c'])
+    loaded.load_model(dump)
+
+    percentiles = loaded.percentile(np.sort(scores))
+    assert np.all(np.diff(percentiles) >= 0)
+    assert percentiles[0] < 1 and percentiles[-1] == 100
+    assert abs(np.median(loaded.percentile(scores)) - 50) < 1
+    assert loaded.percentile(np.array([scores.max() + 1]))[0] == 100
@@ -16,7 +16,9 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 from batea import OutputManager, NmapReport, Host, Port, FeatureBase
+from batea.core.progress import Progress
 from ipaddress import ip_address
+import io
 
 
 def test_general_add_data_create_key_if_key_not_in_data():
@@ -76,3 +78,19 @@ def test_add_host_info():
 
     assert len(output_manager.data['host_info'][0]['ports']) == 1
     assert output_manager.data['host_info'][0]['ports'][0]['port'] == 88
+
+
+def test_progress_reports_throughput_and_eta():
+    items = list(range(1000))
+    assert Progress().track(items, 'parse', total=2000) is items
+
+    stream = io.StringIO()
+    progress = Progress(enabled=True, interval=0, stream=stream)
+    assert list(progress.track(iter(items), 'parse', total=2000)) == items
+    with progress.stage('score', 1000):
+        pass
+
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith('parse: 256/2000 hosts') and 'ETA' in lines[0]
+    assert lines[-2].startswith('parse: 1000 hosts') and 'done' in lines[-2]
+    assert lines[-1].startswith('score: 1000 hosts')
@@ -15,17 +15,28 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from batea import NmapReportParser, CSVFileParser
+from batea import NmapReportParser, CSVFileParser, MasscanParser, NmapGrepableParser, merge_hosts
+from batea.core.ingest import open_input, ingest, report_totals
 from os.path import join, dirname
+import bz2
+import gzip
+import io
+import lzma
 
 nmap_full_filename = join(dirname(__file__), "samples/single_full.xml")
 nmap_base_filename = join(dirname(__file__), "samples/single_base.xml")
 nmap_malformed_filename = join(dirname(__file__), "samples/single_with_nulls.xml")
+nmap_dual_stack_filename = join(dirname(__file__), "samples/dual_stack.xml")
+nmap_scripts_filename = join(dirname(__file__), "samples/scripts.xml")
 
 csv_short_filename = join(dirname(__file__), 'samples/batea_simple_csv')
 csv_long_filename = join(dirname(__file__), 'samples/batea_long_csv')
 csv_null_filename = join(dirname(__file__), 'samples/batea_null_csv')
 
+masscan_list_filename = join(dirname(__file__), 'samples/masscan_list')
+masscan_json_filename = join(dirname(__file__), 'samples/masscan_json')
+grepable_filename = join(dirname(__file__), 'samples/single.gnmap')
+
 
 def test_nmap_parser_generates_list_of_hosts():
     parser = NmapReportParser()
@@ -149,3 +160,116 @@ def test_csv_parser_doesnt_generates_list_of_ports_if_port_number_is_null_or_zer
     assert len(hosts) == 2
     assert len(hosts[0].ports) == 1
     assert len(hosts[1].ports) == 0
+
+
+def test_nmap_parser_extracts_ipv6_addresses():
+    parser = NmapReportParser()
+    with open(nmap_dual_stack_filename, 'r') as f:
+        hosts = list(parser.load_hosts(f))
+
+    assert hosts[0].ipv4 is None
+    assert hosts[0].ipv6.compressed == "2001:db8:85a3::8a2e:370:7334"
+    assert hosts[0].address == hosts[0].ipv6
+    assert hosts[1].ipv4.exploded == "192.168.1.3"
+    assert hosts[1].ipv6.compressed == "2001:db8:85a3::1"
+    assert hosts[1].address == hosts[1].ipv4
+
+
+def test_csv_parser_accepts_ipv6_addresses():
+    parser = CSVFileParser()
+    hosts = parser.load_hosts(io.StringIO("ipv4,port,state\n2001:db8::1,22,open\n2001:db8::1,80,open\n"))
+
+    assert len(hosts) == 1
+    assert hosts[0].ipv4 is None
+    assert hosts[0].ipv6.compressed == "2001:db8::1"
+    assert len(hosts[0].ports) == 2
+
+
+def test_masscan_parser_reads_list_output():
+    parser = MasscanParser()
+    with open(masscan_list_filename, 'r') as f:
+        hosts = merge_hosts(parser.load_hosts(f))
+
+    assert [host.ipv4.exploded for host in hosts] == ['10.0.0.1', '10.0.0.2']
+    assert sorted(port.port for port in hosts[0].ports) == [80, 443]
+    assert [port.software for port in hosts[0].ports if port.port == 80] == ['Apache/2.4.6 (CentOS)']
+
+
+def test_masscan_parser_reads_json_output():
+    parser = MasscanParser()
+    with open(masscan_json_filename, 'r') as f:
+        hosts = list(parser.load_hosts(f))
+
+    assert len(hosts) == 3
+    assert hosts[0].ports[0].port == 80
+    assert hosts[0].ports[0].state == 'open'
+    assert hosts[2].ports[0].service == 'http'
+
+
+def test_grepable_parser_generates_list_of_hosts():
+    parser = NmapGrepableParser()
+    with open(grepable_filename, 'r') as f:
+        hosts = list(parser.load_hosts(f))
+
+    assert len(hosts) == 2
+    assert hosts[0].ipv4.exploded == '192.168.1.1'
+    assert hosts[0].hostname == 'test1.organization.org'
+    assert hosts[0].os_info['name'] == 'Linux 3.X'
+    assert [port.port for port in hosts[0].ports] == [22, 80, 8443]
+    assert hosts[0].ports[0].service == 'ssh'
+    assert hosts[0].ports[0].software == 'OpenSSH 7.4 (protocol 2.0)'
+    assert hosts[0].ports[2].state == 'filtered'
+    assert hosts[1].hostname is None
+    assert hosts[1].ports[0].port == 445
+
+
+def test_open_input_decompresses_by_magic_bytes():
+    with open(nmap_full_filename, 'rb') as f:
+        content = f.read()
+
+    for compress in [gzip.compress, bz2.compress, lzma.compress, lambda data: data]:
+        hosts = list(NmapReportParser().load_hosts(open_input(io.BytesIO(compress(content)))))
+
+        assert [host.ipv4.exploded for host in hosts] == ["192.168.1.1", "192.168.1.2"]
+
+
+def test_ingest_keeps_source_order_with_several_workers():
+    sources = []
+    for filename, parser in [(nmap_full_filename, NmapReportParser()), (csv_long_filename, CSVFileParser()),
+                             (nmap_base_filename, NmapReportParser())]:
+        with open(filename, 'rb') as f:
+            sources.append((parser, io.BytesIO(gzip.compress(f.read()))))
+
+    hosts = list(ingest(sources, workers=3))
+
+    assert len(hosts) == 6
+    assert hosts[0].ipv4.exploded == "192.168.1.1"
+    assert hosts[-1].ipv4.exploded == "192.168.10.11"
+
+
+def test_nmap_parser_keeps_only_requested_script_outputs():
+    with open(nmap_scripts_filename, 'rb') as f:
+        hosts = list(NmapReportParser().load_hosts(f))
+    assert all(port.scripts is None for host in hosts for port in host.ports)
+
+    with open(nmap_scripts_filename, 'rb') as f:
+        hosts = list(NmapReportParser(script_ids=['ssl-cert']).load_hosts(f))
+    https = hosts[0].ports[1]
+
+    assert hosts[0].ports[0].scripts is None
+    assert 'http-title' not in https.scripts
+    assert https.script('ssl-cert')['validity.notAfter'] == '2019-01-01T00:00:00'
+    assert https.script('ssl-cert')['issuer.commonName'] == 'appliance'
+    assert https.script('ssl-cert')['output'] == 'Subject: commonName=appliance'
+
+
+def test_report_totals_read_from_the_headers():
+    with open(nmap_base_filename, 'rb') as f:
+        f.read(10)
+        totals = report_totals(f)
+        assert f.tell() == 10
+    assert totals == dict(hosts=1, scanned=1, services=1000)
+
+    with open(nmap_base_filename, 'rb') as f:
+        compressed = io.BytesIO(gzip.compress(f.read()))
+    assert report_totals(compressed) == dict(hosts=None, scanned=None, services=None)
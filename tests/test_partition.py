@@ -0,0 +1,81 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea import Host, CSVFileParser
+from batea.core.partition import partition_hosts, score_partitions, top_per_group
+from sklearn.ensemble import IsolationForest
+from ipaddress import ip_address
+import io
+import numpy as np
+
+
+def test_partition_hosts_by_cidr_prefix():
+    hosts = [Host(ip_address('10.0.0.1')), Host(ip_address('10.0.1.1')), Host(ip_address('10.0.0.200')),
+             Host(ipv6=ip_address('2001:db8::1'))]
+
+    partitions = partition_hosts(hosts, '/24')
+
+    assert list(partitions) == ['10.0.0.0/24', '10.0.1.0/24', '2001:d00::/24']
+    assert partitions['10.0.0.0/24'].tolist() == [0, 2]
+
+
+def test_partition_hosts_by_csv_column():
+    csv = io.StringIO("ipv4,port,site\n10.0.0.1,22,mtl\n10.0.0.2,22,qc\n10.0.0.3,80,mtl\n")
+    hosts = list(CSVFileParser().load_hosts(csv))
+
+    partitions = partition_hosts(hosts, 'site')
+
+    assert {key: rows.tolist() for key, rows in partitions.items()} == {'mtl': [0, 2], 'qc': [1]}
+
+
+def test_score_partitions_normalizes_each_segment():
+    random_state = np.random.RandomState(0)
+    matrix = np.concatenate((random_state.normal(0, 1, (40, 2)), random_state.normal(100, 10, (40, 2)),
+                             random_state.normal(0, 1, (4, 2))))
+    partitions = {'a': np.arange(40), 'b': np.arange(40, 80), 'c': np.arange(80, 84)}
+
+    scores = score_partitions(matrix, partitions, min_size=10, workers=2,
+                              model=IsolationForest(n_estimators=10, random_state=0))
+
+    assert scores.shape == (84,)
+    for rows in (partitions['a'], partitions['b']):
+        assert abs(np.mean(scores[rows])) < 1e-9
+        assert abs(np.std(scores[rows]) - 1) < 1e-9
+    assert np.all(np.isfinite(scores[partitions['c']]))
+
+
+def test_top_per_group_keeps_best_hosts_of_every_group():
+    hosts = [Host(ip_address('10.0.0.1'), os_info={'family': 'Linux'}),
+             Host(ip_address('10.0.0.2'), os_info={'family': 'Windows'}),
+             Host(ip_address('10.0.0.3'), os_info={'family': 'Linux'}),
+             Host(ip_address('10.0.0.4'), os_info={'family': 'Linux'}),
+             Host(ip_address('10.0.0.5'))]
+    scores = np.array([.3, .2, .9, .5, .1])
+
+    groups = top_per_group(hosts, scores, 'os', 2)
+
+    assert groups == [('Linux', [2, 3]), ('Windows', [1]), (None, [4])]
+
+
+def test_group_by_hostname_domain():
+    hosts = [Host(ip_address('10.0.0.1'), hostname='web.corp.example.com'),
+             Host(ip_address('10.0.0.2'), hostname='DB.Corp.example.com'),
+             Host(ip_address('10.0.0.3'), hostname='lab.example.com')]
+
+    groups = top_per_group(hosts, np.array([.1, .2, .3]), 'domain', 1)
+
+    assert groups == [('example.com', [2]), ('corp.example.com', [1])]
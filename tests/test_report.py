@@ -15,9 +15,13 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from batea import NmapReport, Host
+from batea import NmapReport, Host, Port, merge_hosts
+from batea.core.quantization import QuantizedMatrix
 from batea.features import FeatureBase
+from batea.features.basic_features import IpOctetFeature
 from ipaddress import ip_address
+import numpy as np
+import io
 
 
 def test_add_features():
@@ -41,3 +45,72 @@ def test_generate_base_representation():
     array = report.generate_matrix_representation()
 
     assert array.shape == (2, 0)
+
+
+def test_generate_float32_representation():
+    report = NmapReport(dtype=np.float32)
+    report.hosts = [Host(ip_address('192.168.1.1')), Host(ip_address('192.168.1.2'))]
+    report.add_feature(IpOctetFeature(3))
+
+    array = report.generate_matrix_representation()
+
+    assert array.dtype == np.float32
+    assert list(array[:, 0]) == [1, 2]
+
+
+def test_quantized_matrix_is_lossless_for_integer_columns():
+    matrix = np.array([[1, 0.5, 3], [200, 0.75, 3], [7, 1.9, 3]], dtype=np.float32)
+
+    quantized = QuantizedMatrix.from_matrix(matrix, np.uint8)
+    dump = io.BytesIO()
+    quantized.save(dump)
+    dump.seek(0)
+    decoded = QuantizedMatrix.load(dump).to_matrix()
+
+    assert quantized.codes.dtype == np.uint8
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded[:, [0, 2]], matrix[:, [0, 2]])
+    assert np.allclose(decoded[:, 1], matrix[:, 1], atol=quantized.scale[1] / 2)
+
+
+def test_quantized_columns_of_a_memory_mapped_matrix(tmp_path):
+    matrix = np.lib.format.open_memmap(str(tmp_path / 'matrix.npy'), mode='w+', dtype=np.float32, shape=(3, 2))
+    matrix[:] = [[1, 0.25], [2, 0.25], [3, 0.25]]
+    scores = np.array([0.1, 0.7, 0.4])
+
+    quantized = QuantizedMatrix.from_columns([matrix[:, 0], matrix[:, 1], scores], 3, np.uint8)
+    decoded = quantized.to_matrix(np.float64)
+
+    assert np.array_equal(decoded[:, :2], matrix)
+    assert np.allclose(decoded[:, 2], scores, atol=quantized.scale[2] / 2)
+
+
+def make_scans():
+    sweep = [Host(ip_address(f'10.0.{i // 256}.{i % 256}'),
+                  ports=[Port(port=22, protocol='tcp', state='open'),
+                         Port(port=80, protocol='tcp', state='open')]) for i in range(300)]
+    version_scan = [Host(ip_address(f'10.0.{i // 256}.{i % 256}'), hostname=f'host{i}',
+                         os_info={'name': 'Linux', 'accuracy': 90},
+                         ports=[Port(port=22, protocol='tcp', state='open', service='ssh', software='OpenSSH'),
+                                Port(port=443, protocol='tcp', state='open', service='https')])
+                    for i in range(0, 300, 2)]
+    return sweep + version_scan
+
+
+def check_merged(hosts):
+    assert len(hosts) == 300
+    by_address = {host.address.exploded: host for host in hosts}
+    merged = by_address['10.0.0.2']
+    assert merged.hostname == 'host2'
+    assert merged.os_info['name'] == 'Linux'
+    assert sorted(port.port for port in merged.ports) == [22, 80, 443]
+    assert [port.software for port in merged.ports if port.port == 22] == ['OpenSSH']
+    assert len(by_address['10.0.0.3'].ports) == 2
+
+
+def test_merge_hosts_by_address():
+    check_merged(merge_hosts(make_scans()))
+
+
+def test_merge_hosts_spilled_to_disk():
+    check_merged(merge_hosts(make_scans(), max_hosts=50))
@@ -0,0 +1,90 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea import NmapReport, Host, Port
+from batea.core import BateaModel
+from batea.core.shard import ShardResult
+from batea.features.basic_features import IpOctetFeature, PortEntropyFeature
+from sklearn.ensemble import IsolationForest
+from concurrent.futures import ProcessPoolExecutor
+from ipaddress import ip_address
+import io
+import numpy as np
+
+
+def make_report(hosts):
+    report = NmapReport()
+    report.add_feature(IpOctetFeature(3))
+    report.add_feature(PortEntropyFeature())
+    report.hosts = hosts
+    return report
+
+
+def make_hosts():
+    return [Host(ip_address(f'10.0.0.{i}'), ports=[Port(port=22), Port(port=80 + i % 7 * (i % 5))])
+            for i in range(1, 61)]
+
+
+def score_shard(task):
+    dump, hosts = task
+    report = make_report(hosts)
+    batea = BateaModel(report_features=report.get_feature_names())
+    batea.load_model(io.BytesIO(dump))
+    report.set_statistics(batea.statistics)
+    matrix = report.generate_matrix_representation()
+    shard = io.BytesIO()
+    ShardResult.from_report(report, matrix, batea.score(matrix), top_k=5).save(shard)
+    return shard.getvalue()
+
+
+def test_merged_shards_match_scoring_all_hosts_at_once():
+    report = make_report(make_hosts())
+    report.fit_features()
+    matrix = report.generate_matrix_representation()
+    batea = BateaModel(model=IsolationForest(n_estimators=10, random_state=0),
+                       report_features=report.get_feature_names(), statistics=report.get_statistics())
+    batea.fit(matrix)
+    scores = batea.score(matrix)
+    dump = io.BytesIO()
+    batea.dump_model(dump)
+
+    hosts = make_hosts()
+    tasks = [(dump.getvalue(), hosts[i::3]) for i in range(3)]
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        shards = [ShardResult.load(io.BytesIO(shard)) for shard in executor.map(score_shard, tasks)]
+    merged = ShardResult.merge(shards)
+
+    assert merged.top_k == 5
+    assert np.allclose(merged.top_scores, np.sort(scores)[::-1][:5])
+    assert sorted(merged.scores) == sorted(scores)
+    assert merged.histogram.tolist() == np.histogram(scores, bins=100, range=(0., 1.))[0].tolist()
+    assert merged.top_matrix.shape == (5, 2)
+
+
+def test_merged_top_is_cut_at_the_smallest_truncated_top_k():
+    report = make_report(make_hosts())
+    scores = np.linspace(0., 1., 60)
+    matrix = np.zeros((60, 2))
+    hosts = report.hosts
+    shards = [ShardResult.from_report(make_report(hosts[:30]), matrix[:30], scores[:30], top_k=10),
+              ShardResult.from_report(make_report(hosts[30:50]), matrix[30:50], scores[30:50], top_k=3),
+              ShardResult.from_report(make_report(hosts[50:]), matrix[50:], scores[50:], top_k=20)]
+
+    merged = ShardResult.merge(shards)
+
+    assert merged.top_k == 3
+    assert np.allclose(merged.top_scores, np.sort(scores)[::-1][:3])
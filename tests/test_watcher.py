@@ -0,0 +1,94 @@
+# batea: context-driven asset ranking using anomaly detection
+# Copyright (C) 2019-  Delve Labs inc.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from batea import NmapReportParser, DirectoryWatcher, build_report
+from os.path import join, dirname
+import numpy as np
+import os
+import shutil
+
+nmap_full_filename = join(dirname(__file__), "samples/single_full.xml")
+nmap_base_filename = join(dirname(__file__), "samples/single_base.xml")
+
+
+class CountingParser(NmapReportParser):
+
+    def __init__(self):
+        self.calls = 0
+
+    def load_hosts(self, file):
+        self.calls += 1
+        return super().load_hosts(file)
+
+
+def test_watcher_ingests_new_files_only(tmp_path):
+    parser = CountingParser()
+    watcher = DirectoryWatcher(str(tmp_path), build_report(), parser)
+    shutil.copy(nmap_full_filename, str(tmp_path / "a.xml"))
+
+    assert watcher.poll() == [str(tmp_path / "a.xml")]
+    assert len(watcher.report.hosts) == 2
+
+    assert watcher.poll() == []
+    assert parser.calls == 1
+
+    shutil.copy(nmap_base_filename, str(tmp_path / "b.xml"))
+    assert watcher.poll() == [str(tmp_path / "b.xml")]
+    assert parser.calls == 2
+    assert len(watcher.report.hosts) == 3
+    assert watcher.matrix_representation.shape == (3, 20)
+
+
+def test_watcher_matrix_matches_full_rebuild(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), build_report(), NmapReportParser())
+    shutil.copy(nmap_full_filename, str(tmp_path / "a.xml"))
+    watcher.poll()
+    shutil.copy(nmap_base_filename, str(tmp_path / "b.xml"))
+    watcher.poll()
+
+    expected = watcher.report.generate_matrix_representation()
+
+    assert np.allclose(watcher.matrix_representation, expected)
+
+
+def test_watcher_drops_hosts_of_removed_files(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), build_report(), NmapReportParser())
+    shutil.copy(nmap_full_filename, str(tmp_path / "a.xml"))
+    shutil.copy(nmap_base_filename, str(tmp_path / "b.xml"))
+    watcher.poll()
+
+    os.remove(str(tmp_path / "a.xml"))
+
+    assert watcher.poll() == [str(tmp_path / "a.xml")]
+    assert len(watcher.report.hosts) == 1
+    assert watcher.matrix_representation.shape == (1, 20)
+
+
+def test_watcher_retries_incomplete_files(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), build_report(), NmapReportParser())
+    with open(nmap_full_filename) as f:
+        content = f.read()
+    with open(str(tmp_path / "a.xml"), 'w') as f:
+        f.write(content[:len(content) // 2])
+
+    assert watcher.poll() == []
+
+    with open(str(tmp_path / "a.xml"), 'w') as f:
+        f.write(content)
+
+    assert watcher.poll() == [str(tmp_path / "a.xml")]
+    assert len(watcher.report.hosts) == 2